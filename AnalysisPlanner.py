@@ -0,0 +1,330 @@
+"""
+Name: Analysis Planner
+Author: Nikhil Trivedi
+Description:
+This script makes a whole set of products (steering tables, cluster plots, line plots, difference maps, and correlation maps) in one pass over
+the data, rather than running each product's script and having every one of them read its own ATCF and GRIB data. Each product lists the tracks
+and the (model, member, forecast hour, variable, level) fields it needs, the needs of all of them are merged so every track and field is read
+exactly once, and each file's fields are handed to every product that uses them as soon as they're read. Pressure levels are taken from a
+variable's full column when it's already being read (e.g. 500mb winds from a file whose winds are read for the steering), and products built on
+the steering values (clusters and line plots by steerSpeed, steerDirection, or vortexDepth) are finished after the steering, which is added to
+the products if it wasn't requested. The products are listed in the namelist below or in a JSON file, each as a dictionary with its type and
+any settings that differ from productDefaults. Below is a namelist with parameters that can be modified to whatever is of interest.
+Descriptions of each of the parameters are commented to the right of them.
+Last modified July 31, 2024
+"""
+
+###################################################################################################################################
+# adjust these parameters based on your needs
+products = [{"type": "steering", "model": "HFSB_default"},
+            {"type": "steering", "model": "HFSB_tiedtke"},
+            {"type": "clusters", "clusterType": "steerSpeed", "variable": "height", "level": 500, "forecastHour": 24},
+            {"type": "linePlot", "clusterType": "MSLP"},
+            {"type": "diffMap", "models": ["HFSB_default", "HFSB_tiedtke"], "variable": "height", "level": 500, "forecastHour": 24},
+            {"type": "correlation", "model": "HFSB_default", "forecastHour": 24}] # products to make (see productDefaults for their settings)
+configPath = None # JSON file with a list of products to make instead of the ones above (can also be given as the first argument)
+prefetchDepth = 4 # number of files to read ahead while the current one is processed
+prefetchBytes = 8 * 1024**3 # maximum memory that read-ahead files can take up
+dryRun = False # only print the reads that the products need (the ATCF files are still read, since the clusters depend on them)
+###################################################################################################################################
+
+import sys
+import json
+import functools
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import UsefulFunctions as uf
+import ParallelFunctions as paf
+import SteerValuesGetter as sv
+import RidgeCorrelation as rc
+from LazyImports import LazyModule
+
+# the plotting scripts are only imported once a product that uses them is finished
+ec = LazyModule("EnsembleClustering")
+elp = LazyModule("EnsembleLinePlots")
+dfp = LazyModule("HafsDiffPlotter")
+
+# the settings of each type of product, which are the same as the namelists of the scripts that make them
+allMembers = list(range(0, 31))
+productDefaults = {"steering": {"model": "HFSB_default", "members": allMembers, "hours": [int(forecastHour) for forecastHour in sv.hours]},
+                   "clusters": {"models": ["HFSB_default", "HFSB_tiedtke"], "members": allMembers, "forecastHour": 24, "clusterMembers": 3,
+                                "variable": "height", "level": 500, "clusterType": "track", "clusterMethod": "rank", "decimate": True},
+                   "linePlot": {"models": ["HFSB_default", "HFSB_tiedtke", "GFS_analysis"], "members": allMembers, "clusterType": "MSLP"},
+                   "diffMap": {"models": ["HFSB_default", "HFSB_tiedtke"], "variable": "mslp", "level": 500, "forecastHour": 72,
+                               "runType": "control", "decimate": True},
+                   "correlation": {"model": "HFSB_default", "members": allMembers, "forecastHour": 24, "level": 500}}
+
+# the steering values that can be clustered on, in the order SteerValuesGetter returns them, and the order the products are finished in
+steerTypes = ["steerSpeed", "steerDirection", "vortexDepth"]
+typeOrder = ["steering", "correlation", "diffMap", "clusters", "linePlot"]
+
+
+def getModelMembers(model, members):
+    # GFS analysis only has one member
+    return [0] if model == "GFS_analysis" else list(members)
+
+
+def getProducts(productList):
+    # this function fills in the defaults of every product and adds the steering that clusters and line plots of the steering values need,
+    # widening a requested steering product to every member and hour they use rather than adding a second one
+    products = [dict(productDefaults[product["type"]], **product) for product in productList]
+    for product in list(products):
+        if product["type"] not in ["clusters", "linePlot"] or product["clusterType"] not in steerTypes:
+            continue
+        # best track isn't drawn on the line plots of the steering values, but the cluster plot's GFS panel is labeled with its steering
+        models = product["models"] + ["GFS_analysis"] if product["type"] == "clusters" else product["models"][:2]
+        for model in models:
+            members = getModelMembers(model, product["members"])
+            steering = next((other for other in products if other["type"] == "steering" and other["model"] == model), None)
+            if steering is None:
+                products.append(dict(productDefaults["steering"], type="steering", model=model, members=members))
+            else:
+                steering["members"] = sorted(set(steering["members"]) | set(members))
+                steering["hours"] = productDefaults["steering"]["hours"]
+    return products
+
+
+def getTrackKeys(product):
+    # returns the (model, member) of every ATCF file a product needs
+    if product["type"] == "steering":
+        return [(product["model"], member) for member in getModelMembers(product["model"], product["members"])]
+    elif product["type"] == "clusters":
+        return [(model, member) for model in product["models"] + ["GFS_analysis"] for member in getModelMembers(model, product["members"])]
+    elif product["type"] == "linePlot":
+        return [(model, member) for model in product["models"] for member in getModelMembers(model, product["members"])]
+    return []
+
+
+def getTrackFrames(tracks, results, model, members, clusterType):
+    # returns copies of the members' ATCF DataFrames (so the plots can modify them), adding the steering values as a column if there are any
+    frames = [tracks[(model, member)].copy() for member in members]
+    if clusterType in steerTypes and ("steering", model) in results:
+        steering = results[("steering", model)]
+        hourIdx = [steering["hours"].index(forecastHour) for forecastHour in sv.hours]
+        for frame, member in zip(frames, members):
+            frame[clusterType] = steering["values"][steering["members"].index(member), hourIdx, steerTypes.index(clusterType)]
+    return frames
+
+
+def getFieldKey(variable, level):
+    # single-level variables are read the same way for any level, so they're all stored under -999
+    if uf.keysDict[variable].get('typeOfLevel') != 'isobaricInhPa':
+        return (variable, -999)
+    return (variable, level)
+
+
+def addTask(plan, model, member, forecastHour, fields, task):
+    # this function adds the fields a product needs from a file to the plan, along with the task that's run as task(*fields) once they're read
+    fields = [getFieldKey(variable, level) for variable, level in fields]
+    fileFields, tasks = plan.setdefault((model, member, forecastHour), (set(), []))
+    fileFields.update(fields)
+    tasks.append((fields, task))
+
+
+def addToMean(means, key, varData):
+    # adds a member's field to a running mean, which is added up in float64 and skips missing values the same way getMemberData does
+    if key not in means:
+        means[key] = [varData.fillna(0).astype(np.float64), varData.notnull().astype(np.int32)]
+    else:
+        means[key][0] += varData.fillna(0)
+        means[key][1] += varData.notnull()
+
+
+def getMean(means, key):
+    total, count = means[key]
+    return (total / count.where(count > 0)).astype(uf.precision)
+
+
+def storeField(fields, key, varData):
+    fields[key] = varData
+
+
+def addSteering(state, model, member, forecastHour, zonalData, meridionalData):
+    state["steerValues"][(member, forecastHour)] = sv.getSteering(model, member, forecastHour, (zonalData, meridionalData))
+
+
+def planSteering(product, tracks, plan):
+    # the steering of every member and hour is calculated from the full column of winds as soon as they're read
+    state = {"steerValues": {}}
+    for member in getModelMembers(product["model"], product["members"]):
+        for forecastHour in product["hours"]:
+            addTask(plan, product["model"], member, forecastHour, [("zonal wind", -999), ("meridional wind", -999)],
+                    functools.partial(addSteering, state, product["model"], member, forecastHour))
+    return state
+
+
+def finishSteering(product, state, tracks, results):
+    # saves the steering tables the same way SteerValuesGetter does
+    model, members, hours = product["model"], getModelMembers(product["model"], product["members"]), list(product["hours"])
+    steerValues = np.array([[state["steerValues"][(member, forecastHour)] for forecastHour in hours] for member in members])
+    np.savetxt(f'./SteerValues/{model}_steerSpeed.txt', steerValues[:, :, 0], fmt='%.1f')
+    np.savetxt(f'./SteerValues/{model}_steerDirection.txt', steerValues[:, :, 1], fmt='%.1f')
+    np.savetxt(f'./SteerValues/{model}_vortexDepth.txt', steerValues[:, :, 2], fmt='%d')
+    results[("steering", model)] = {"members": members, "hours": hours, "values": steerValues}
+    print(f"saved ./SteerValues/{model}_steer*.txt")
+
+
+def planClusters(product, tracks, plan):
+    # if the clusters only depend on the tracks, only the members in them are read. Otherwise they depend on the steering, so every member's
+    # field is kept until the steering is done
+    state = {"fields": {}}
+    for model in product["models"] + ["GFS_analysis"]:
+        members = getModelMembers(model, product["members"])
+        if product["clusterType"] not in steerTypes and model != "GFS_analysis":
+            frames = [tracks[(model, member)] for member in members]
+            ranks = uf.getClusterRanks(frames, sv.hours, product["forecastHour"], product["clusterType"])
+            clusterIdx = np.concatenate(ec.getClusterIndices(frames, ranks, product["clusterMembers"], product["clusterMethod"]))
+            members = sorted({members[i] for i in clusterIdx})
+        for member in members:
+            addTask(plan, model, member, product["forecastHour"], [(product["variable"], product["level"])],
+                    functools.partial(storeField, state["fields"], (model, member)))
+    return state
+
+
+def finishClusters(product, state, tracks, results):
+    # makes the same clusters and plot as EnsembleClustering
+    forecastHour, clusterType = product["forecastHour"], product["clusterType"]
+    clusters = []
+    for model in product["models"]:
+        members = getModelMembers(model, product["members"])
+        frames = getTrackFrames(tracks, results, model, members, clusterType)
+        ranks = uf.getClusterRanks(frames, sv.hours, forecastHour, clusterType)
+        clusterIdx = ec.getClusterIndices(frames, ranks, product["clusterMembers"], product["clusterMethod"])
+        for idx, clusterName in zip(clusterIdx, ec.typeDict[clusterType]):
+            means = {}
+            for i in idx:
+                addToMean(means, model, state["fields"][(model, members[i])])
+            clusters.append([np.array(frames)[idx], getMean(means, model), np.array(ranks)[idx].mean(), f"HFSB {model} {clusterName} Cluster"])
+
+    bTrackFrame = getTrackFrames(tracks, results, "GFS_analysis", [0], clusterType)
+    bTrackAvg = uf.getClusterRanks(bTrackFrame, sv.hours, forecastHour, clusterType)[0]
+    clusters.append([np.array(bTrackFrame), state["fields"][("GFS_analysis", 0)], bTrackAvg, "GFS Analysis"])
+
+    fig = ec.makeClusterPlot(clusters, product["variable"], clusterType, forecastHour, sv.hours, product["decimate"])
+    path = f"./ClusterMaps/{product['variable']}_{clusterType}_clusters_{forecastHour}.png"
+    fig.savefig(path, dpi=300, bbox_inches='tight')
+    print(f"saved {path}")
+
+
+def planLinePlot(product, tracks, plan):
+    # line plots only use the tracks (and the steering)
+    return {}
+
+
+def finishLinePlot(product, state, tracks, results):
+    # makes the same plot as EnsembleLinePlots
+    dataLists = [getTrackFrames(tracks, results, model, getModelMembers(model, product["members"]), product["clusterType"])
+                 for model in product["models"]]
+    fig = elp.makeLinePlot(dataLists, product["clusterType"], sv.hours)
+    path = f"./LinePlots/{product['clusterType']}_line_plot.png"
+    fig.savefig(path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+    print(f"saved {path}")
+
+
+def planDiffMap(product, tracks, plan):
+    # each model's mean is added up as its members are read
+    state = {"means": {}}
+    for model in product["models"]:
+        members = range(0, 1) if product["runType"] == "control" else getModelMembers(model, allMembers)
+        for member in members:
+            addTask(plan, model, member, product["forecastHour"], [(product["variable"], product["level"])],
+                    functools.partial(addToMean, state["means"], model))
+    return state
+
+
+def finishDiffMap(product, state, tracks, results):
+    # makes the same map as HafsDiffPlotter, saved with the same name as BatchPlotter gives it
+    models, variable, level, forecastHour = product["models"], product["variable"], product["level"], product["forecastHour"]
+    fig = dfp.makeDiffPlot(getMean(state["means"], models[0]), getMean(state["means"], models[1]), models, variable, level, forecastHour,
+                           product["decimate"])
+    path = f"./IanDiffPlots/{variable}_{product['runType']}_diff_{models[0]}_{models[1]}_{level}mb_hour_{forecastHour}.png"
+    fig.savefig(path, dpi=300, bbox_inches='tight')
+    print(f"saved {path}")
+
+
+def addCorrelationMember(state, model, forecastHour, member, zonalData, meridionalData, heightData):
+    state["steering"][member] = rc.getMemberSteering(member, model, forecastHour, (zonalData, meridionalData))
+    state["heights"][member] = heightData.coarsen(latitude=4, longitude=4, boundary="trim").mean()
+
+
+def planCorrelation(product, tracks, plan):
+    # every member's 600-400mb steering and coarsened heights are calculated as soon as its winds and heights are read
+    state = {"steering": {}, "heights": {}}
+    for member in product["members"]:
+        addTask(plan, product["model"], member, product["forecastHour"], [("zonal wind", -999), ("meridional wind", -999), ("height", product["level"])],
+                functools.partial(addCorrelationMember, state, product["model"], product["forecastHour"], member))
+    return state
+
+
+def finishCorrelation(product, state, tracks, results):
+    # makes the same map as RidgeCorrelation (with corrType = steering)
+    members = list(product["members"])
+    heightData = np.array([state["heights"][member].values for member in members])
+    corrData, sigData = rc.getCorrelation(heightData, [state["steering"][member][0] for member in members])
+    fig = rc.makeCorrelationPlot(state["heights"][members[0]], corrData, sigData, product["model"], product["forecastHour"],
+                                 [state["steering"][member][1] for member in members])
+    path = f"./BasicPlots/correlation_plot_{product['model']}.png"
+    fig.savefig(path, dpi=300, bbox_inches='tight')
+    print(f"saved {path}")
+
+
+productTypes = {"steering": (planSteering, finishSteering), "clusters": (planClusters, finishClusters), "linePlot": (planLinePlot, finishLinePlot),
+                "diffMap": (planDiffMap, finishDiffMap), "correlation": (planCorrelation, finishCorrelation)}
+
+
+def loadFields(model, member, forecastHour, fields):
+    # this function reads every field of a file that the plan needs, taking pressure levels from a variable's full column if it's being read
+    loaded = {}
+    for variable, level in sorted(fields, key=lambda field: field[1] != -999):
+        if level != -999 and (variable, -999) in loaded:
+            loaded[(variable, level)] = loaded[(variable, -999)].sel(isobaricInhPa=level)
+        else:
+            loaded[(variable, level)] = uf.getMemberData(model, variable, [member], forecastHour, level)
+    return loaded
+
+
+def getPlanReads(plan):
+    # the number of fields that are actually read, and the number that the products asked for
+    fieldReads = sum(len([field for field in fileFields if field[1] == -999 or (field[0], -999) not in fileFields]) for fileFields, _ in plan.values())
+    taskReads = sum(len(fields) for _, tasks in plan.values() for fields, _ in tasks)
+    return fieldReads, taskReads
+
+
+def runPlan(plan):
+    # this function reads every file in the plan once, in order with the next files read in the background, and runs each of its tasks
+    fileItems = [(model, member, forecastHour, tuple(sorted(fileFields))) for (model, member, forecastHour), (fileFields, _) in sorted(plan.items())]
+    for (model, member, forecastHour, _), loaded in paf.getPrefetched(fileItems, loadFields, depth=prefetchDepth, maxBytes=prefetchBytes):
+        for fields, task in plan[(model, member, forecastHour)][1]:
+            task(*[loaded[field] for field in fields])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        configPath = sys.argv[1]
+    if configPath is not None:
+        with open(configPath) as file:
+            products = json.load(file)
+    products = getProducts(products)
+
+    # every ATCF file is read once (getMemberTrack keeps them for the steering calculation as well), and then each product adds its reads
+    trackKeys = sorted({key for product in products for key in getTrackKeys(product)})
+    tracks = {(model, member): sv.getMemberTrack(model, member, tuple(sv.hours), sv.storm, sv.init) for model, member in trackKeys}
+    plan, states = {}, []
+    for product in products:
+        states.append(productTypes[product["type"]][0](product, tracks, plan))
+
+    fieldReads, taskReads = getPlanReads(plan)
+    print(f"{len(products)} products need {len(trackKeys)} ATCF files and {fieldReads} fields from {len(plan)} GRIB files "
+          f"(the products asked for {taskReads} fields in total)")
+    for product in products:
+        print("  " + ", ".join(f"{name}: {value}" for name, value in product.items() if name not in ["members", "hours"]))
+    if dryRun:
+        sys.exit()
+
+    runPlan(plan)
+    results = {}
+    for i in sorted(range(len(products)), key=lambda i: typeOrder.index(products[i]["type"])):
+        productTypes[products[i]["type"]][1](products[i], states[i], tracks, results)
@@ -0,0 +1,90 @@
+"""
+Name: Batch Plotter
+Author: Nikhil Trivedi
+Description:
+This script renders the HafsDataPlotter and HafsDiffPlotter maps for every combination of forecast hour, variable, level, and model in the
+namelist, without having to edit and rerun those scripts for each one. It uses a non-interactive backend and splits the maps between a pool
+of processes. The maps for a given forecast hour, variable, and level are all made by the same process, so each model's data only has to be
+read once even when it's used for its own map and for several difference maps. Below is a namelist with parameters that can be modified to
+whatever is of interest. Descriptions of each of the parameters are commented to the right of them.
+Last modified July 31, 2024
+"""
+
+###################################################################################################################################
+# adjust these parameters based on your needs
+forecastHours = [0, 6, 12, 18, 24, 48, 60, 72, 84, 96, 108, 120] # forecast hours to plot
+variables = ["mslp", "height", "shum", "refl", "vector wind"] # variables to plot (check varDict in UsefulFunctions for supported variables)
+levels = [500] # atmospheric levels to plot for (if applicable)
+models = ["HFSA_default", "HFSB_default", "HFSB_progsigma", "HFSB_ras", "HFSB_tiedtke"] # models to make HafsDataPlotter maps for
+diffModels = [["HFSB_default", "HFSB_tiedtke"]] # pairs of models to make HafsDiffPlotter maps for (first minus second)
+runType = "control" # control or mean
+decimate = True # coarsen the data to the figure's resolution before plotting (False plots the full grid)
+processes = None # number of processes to use (None uses every core)
+profile = False # record how long the loading and plotting of each map takes, saving a report and printing a summary at the end (runs serially)
+###################################################################################################################################
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import HafsDataPlotter as dp
+import HafsDiffPlotter as dfp
+import ProfilingFunctions as prof
+
+# variables that HafsDiffPlotter knows how to plot
+diffVariables = ["mslp", "height", "zonal wind"]
+
+
+@prof.profiled("renderGroup", labelArgs=["hour"])
+def renderGroup(forecastHour, variable, level):
+    # this function makes every map for a forecast hour, variable, and level, reading each model's data once
+    if runType == "control":
+        members = range(0, 1)
+    elif runType == "mean":
+        members = range(0, 31)
+
+    plotData = {}
+    def loadData(model):
+        if model not in plotData:
+            plotData[model] = dp.getPlotData(model, variable, members, forecastHour, level)
+        return plotData[model]
+
+    paths = []
+    for model in models:
+        varData, zonalData, meridionalData = loadData(model)
+        fig = dp.makePlot(varData, model, variable, level, forecastHour, zonalData, meridionalData, decimate)
+        path = f"./BasicPlots/{variable}_{runType}_plot_{model}_{level}mb_hour_{forecastHour}.png"
+        with prof.labels(model=model), prof.stage("savefig"):
+            fig.savefig(path, dpi=300, bbox_inches='tight')
+        paths.append(path)
+
+    if variable in diffVariables:
+        for diffPair in diffModels:
+            fig = dfp.makeDiffPlot(loadData(diffPair[0])[0], loadData(diffPair[1])[0], diffPair, variable, level, forecastHour, decimate)
+            path = f"./IanDiffPlots/{variable}_{runType}_diff_{diffPair[0]}_{diffPair[1]}_{level}mb_hour_{forecastHour}.png"
+            with prof.labels(model=f"{diffPair[0]}-{diffPair[1]}"), prof.stage("savefig"):
+                fig.savefig(path, dpi=300, bbox_inches='tight')
+            paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    # single-level variables only need to be plotted once, regardless of how many levels were requested
+    groups = []
+    for forecastHour, variable, level in itertools.product(forecastHours, variables, levels):
+        if variable in ["mslp", "refl"] and level != levels[0]:
+            continue
+        groups.append((forecastHour, variable, level))
+
+    if profile:
+        # only this process is profiled, so every map is made in it rather than being split between a pool
+        prof.enable()
+        for paths in map(renderGroup, *zip(*groups)):
+            for path in paths:
+                print(f"saved {path}")
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for paths in pool.map(renderGroup, *zip(*groups)):
+                for path in paths:
+                    print(f"saved {path}")
@@ -0,0 +1,318 @@
+"""
+Name: Benchmarks
+Author: Nikhil Trivedi
+Description:
+This script times the main stages of the analysis (reading the ATCF and GRIB data, centering, radial averaging, vortex detection, the steering
+calculation, and the correlation map) on synthetic HAFS-like data, so changes to the library can be checked for speed-ups or slow-downs without
+needing the files on /work2. The synthetic ensemble has an idealized vortex moving along each member's ATCF track, sitting in a uniform steering
+flow that's different for every member, and is written as GRIB2 (or NetCDF) files with the same names and layout as the real data. Each stage is
+timed at every scale in the namelist, and its throughput and peak memory are reported and saved to a JSON file. The steering results are also
+checked against the known steering flow and against golden outputs saved by an earlier run (in the same format as the HFSB_*_steer*.txt files),
+and, when the real data is available, the real steering is checked against the committed HFSB_*_steer*.txt files. Below is a namelist with
+parameters that can be modified to whatever is of interest. Descriptions of each of the parameters are commented to the right of them.
+Last modified July 31, 2024
+"""
+
+###################################################################################################################################
+# adjust these parameters based on your needs
+runScales = ["small", "medium"] # scales to run, from the scales dictionary below ("full" needs around 50 GB of disk for GRIB2)
+fileFormat = "grib" # format of the synthetic fields: grib (needs eccodes to write them) or netcdf
+repeats = 3 # number of times each stage is timed (the fastest time is reported)
+benchDir = "./Benchmarks" # where the synthetic data, golden outputs, and results are stored
+updateGolden = False # save this run's steering results as the new golden outputs
+checkCommitted = True # compare the real data's steering to the committed HFSB_*_steer*.txt files (only if the data on /work2 is available)
+###################################################################################################################################
+
+import os
+import json
+import time
+import tracemalloc
+import numpy as np
+import UsefulFunctions as uf
+import CatalogFunctions as cat
+import ParallelFunctions as paf
+import SteerValuesGetter as sv
+import RidgeCorrelation as rc
+from LazyImports import LazyModule
+
+xr = LazyModule("xarray")
+eccodes = LazyModule("eccodes")
+
+# the ensemble size, forecast hours, grid spacing (degrees), and isobaric levels of each scale. The full scale matches the real ensemble
+scales = {"small": {"members": 3, "hours": [0, 24], "resolution": 0.25, "levels": [1000, 925, 850, 700, 600, 500, 400, 300, 250, 200, 150, 100]},
+          "medium": {"members": 10, "hours": [0, 24, 48], "resolution": 0.1, "levels": list(range(1000, 99, -25))},
+          "full": {"members": 31, "hours": [0, 24, 48, 60, 72, 84, 96, 108, 120], "resolution": 0.06, "levels": list(range(1000, 99, -25))}}
+
+# the synthetic grid covers a bit more than the domain that getMemberData subsets to, like the HAFS parent domain does
+gridExtent = (5, 50, 255, 315)
+init = "2022092400"
+
+
+def getFixtureTrack(member):
+    # every member's storm moves north-northwest from the Caribbean at a slightly different speed and heading, deepening over time
+    rng = np.random.default_rng(member)
+    hours = sv.hours
+    lats = 16 + rng.uniform(-0.5, 0.5) + hours * (0.09 + rng.uniform(-0.02, 0.02))
+    lons = 280 + rng.uniform(-0.5, 0.5) - hours * (0.025 + rng.uniform(-0.02, 0.02))
+    mslp = np.round(985 - hours * (0.2 + rng.uniform(0, 0.1)))
+    vmax = np.round(50 + (1000 - mslp) * 0.8)
+    return lats, lons, mslp, vmax
+
+
+def getFixtureSteering(member):
+    # each member's uniform environmental flow (m/s), which the steering calculation should recover
+    rng = np.random.default_rng(1000 + member)
+    return rng.uniform(-6, 2), rng.uniform(1, 6)
+
+
+def writeTrackFile(path, member):
+    # writes an ATCF file in the same format as the HAFS ensemble tracks, with one 34 kt line per forecast hour
+    lats, lons, mslp, vmax = getFixtureTrack(member)
+    speed, direction = uf.getTrackMotion(lats, lons, sv.hours)
+    lines = []
+    for i, hour in enumerate(sv.hours):
+        radii = [int(120 + 10 * i)] * 4
+        fields = ["AL", " 09", f" {init}", f" {member:02}", " HB01", f" {hour:3d}", f" {lats[i] * 10:.0f}N", f" {(360 - lons[i]) * 10:.0f}W",
+                  f" {vmax[i]:3.0f}", f" {mslp[i]:4.0f}", " XX", "  34", " NEQ"] + [f" {radius:4d}" for radius in radii] + \
+                 [" 1010", "  200", "  30", "   0", "   0", "   L", "   0", "    ", " HB01", f" {np.nan_to_num(direction[i]):3.0f}",
+                  f" {np.nan_to_num(speed[i]) * 10:3.0f}"]
+        lines.append(",".join(fields))
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def getFixtureFields(lats, lons, levels, centerLat, centerLon, vmax, minPres, envU, envV):
+    # an idealized vortex (solid body rotation inside the radius of maximum wind, decaying outside of it) that weakens with height until it's
+    # gone at 250mb, sitting in a uniform steering flow, along with heights that have a ridge to the north and a low at the center
+    dx = (lons[np.newaxis, :] - centerLon) * np.cos(np.deg2rad(centerLat))
+    dy = lats[:, np.newaxis] - centerLat
+    r = np.maximum(np.hypot(dx, dy), 1e-6)
+    rmax = 0.5
+    vortexWind = np.where(r < rmax, r / rmax, np.sqrt(rmax / r)) * vmax * 0.514
+    vortexShape = np.exp(-(r / 3)**2)
+    ridge = np.exp(-((lats[:, np.newaxis] - 32) / 6)**2 - ((lons[np.newaxis, :] - 270) / 12)**2)
+
+    fields = {"gh": [], "u": [], "v": []}
+    for level in levels:
+        decay = np.clip((level - 250) / 750, 0, 1)
+        fields["u"].append(envU - vortexWind * decay * dy / r)
+        fields["v"].append(envV + vortexWind * decay * dx / r)
+        fields["gh"].append(44330.8 * (1 - (level / 1013.25)**0.1903) + 60 * ridge - 150 * decay * vortexShape)
+    fields = {name: np.array(values, dtype=np.float32) for name, values in fields.items()}
+    fields["prmsl"] = (101300 - (1010 - minPres) * 100 * vortexShape).astype(np.float32)
+    return fields
+
+
+def writeGribFile(path, lats, lons, levels, hour, fields):
+    # writes the fields as GRIB2 messages on a regular lat/lon grid, the same way the real files are laid out for cfgrib
+    resolution = lats[1] - lats[0]
+    with open(path, "wb") as file:
+        messages = [("isobaricInhPa", name, i, level) for name in ["gh", "u", "v"] for i, level in enumerate(levels)] + [("meanSea", "prmsl", None, 0)]
+        for typeOfLevel, name, i, level in messages:
+            handle = eccodes.codes_grib_new_from_samples("regular_ll_pl_grib2")
+            eccodes.codes_set_key_vals(handle, {"Ni": len(lons), "Nj": len(lats), "jScansPositively": 1,
+                                                "latitudeOfFirstGridPointInDegrees": lats[0], "latitudeOfLastGridPointInDegrees": lats[-1],
+                                                "longitudeOfFirstGridPointInDegrees": lons[0], "longitudeOfLastGridPointInDegrees": lons[-1],
+                                                "iDirectionIncrementInDegrees": resolution, "jDirectionIncrementInDegrees": resolution,
+                                                "dataDate": int(init[:8]), "dataTime": int(init[8:]) * 100, "stepUnits": 1, "forecastTime": hour})
+            eccodes.codes_set(handle, "typeOfLevel", typeOfLevel)
+            if typeOfLevel == "isobaricInhPa":
+                eccodes.codes_set(handle, "level", level)
+            eccodes.codes_set(handle, "shortName", name)
+            values = fields[name][i] if i is not None else fields[name]
+            eccodes.codes_set_values(handle, values.astype(np.float64).ravel())
+            eccodes.codes_write(handle, file)
+            eccodes.codes_release(handle)
+
+
+def writeNetcdfFile(path, lats, lons, levels, fields):
+    # writes the fields with the same variable, dimension, and coordinate names cfgrib would give them
+    dims = ("isobaricInhPa", "latitude", "longitude")
+    dataset = xr.Dataset({name: (dims if values.ndim == 3 else dims[1:], values) for name, values in fields.items()},
+                         coords={"isobaricInhPa": np.array(levels, dtype=float), "latitude": lats, "longitude": lons})
+    dataset.to_netcdf(path)
+
+
+def makeFixtures(scaleName, scale):
+    # this function writes the synthetic ATCF and field files for a scale (unless they've already been made) and catalogs them
+    model = f"HFSB_{scaleName}"
+    scaleDir = os.path.join(benchDir, "data", f"{scaleName}_{fileFormat}")
+    manifestPath = os.path.join(scaleDir, "manifest.json")
+    manifest = dict(scale, fileFormat=fileFormat)
+    savedManifest = None
+    if os.path.exists(manifestPath):
+        with open(manifestPath) as file:
+            savedManifest = json.load(file)
+    if savedManifest != manifest:
+        print(f"writing the {scaleName} fixtures to {scaleDir}...")
+        trackDir = os.path.join(scaleDir, "tracks", model, init)
+        fieldDir = os.path.join(scaleDir, "fields", model, init)
+        os.makedirs(trackDir, exist_ok=True)
+        os.makedirs(fieldDir, exist_ok=True)
+
+        resolution = scale["resolution"]
+        lats = np.round(np.arange(gridExtent[0], gridExtent[1] + resolution / 2, resolution), 4)
+        lons = np.round(np.arange(gridExtent[2], gridExtent[3] + resolution / 2, resolution), 4)
+        for member in range(scale["members"]):
+            writeTrackFile(os.path.join(trackDir, f"ian09l.{init}.hfsb-h223-ens-cloud.{member:02}.trak.atcfunix"), member)
+            trackLats, trackLons, mslp, vmax = getFixtureTrack(member)
+            envU, envV = getFixtureSteering(member)
+            for hour in scale["hours"]:
+                i = np.where(sv.hours == hour)[0][0]
+                fields = getFixtureFields(lats, lons, scale["levels"], trackLats[i], trackLons[i], vmax[i], mslp[i], envU, envV)
+                fileName = f"00l.{init}.hfsb.parent.atm.f{hour:03}.{model}_{member:02}"
+                if fileFormat == "grib":
+                    writeGribFile(os.path.join(fieldDir, fileName + ".grb2"), lats, lons, scale["levels"], hour, fields)
+                else:
+                    writeNetcdfFile(os.path.join(fieldDir, fileName + ".nc"), lats, lons, scale["levels"], fields)
+        with open(manifestPath, "w") as file:
+            json.dump(manifest, file)
+
+    cat.buildCatalog([("ian", scaleDir)])
+    return model
+
+
+def timeStages(runFunc, traceMemory=False):
+    # this function runs runFunc(stage) and returns the wall time, CPU time, calls, and bytes returned for every stage, along with runFunc's
+    # result. Calling stage(name, func, *args) runs func(*args) and adds it to that stage's totals (along with its peak memory if traceMemory)
+    totals = {}
+
+    def stage(name, func, *args):
+        if traceMemory:
+            startMemory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        wallStart, cpuStart = time.perf_counter(), time.process_time()
+        result = func(*args)
+        wallTime, cpuTime = time.perf_counter() - wallStart, time.process_time() - cpuStart
+
+        stageTotals = totals.setdefault(name, {"seconds": 0.0, "cpuSeconds": 0.0, "calls": 0, "bytes": 0, "peakMB": None})
+        stageTotals["seconds"] += wallTime
+        stageTotals["cpuSeconds"] += cpuTime
+        stageTotals["calls"] += 1
+        stageTotals["bytes"] += paf.getResultBytes(result)
+        if traceMemory:
+            peakMB = (tracemalloc.get_traced_memory()[1] - startMemory) / 1e6
+            stageTotals["peakMB"] = max(stageTotals["peakMB"] or 0, peakMB)
+        return result
+
+    result = runFunc(stage)
+    return totals, result
+
+
+def runPipeline(stage, model, scale):
+    # the stages of the steering calculation and the correlation map for every member and forecast hour of a scale, returning the
+    # (member, hour, [speed, direction, depth]) steering values
+    members, hours = range(scale["members"]), scale["hours"]
+    atcfData = stage("getAtcfData", uf.getAtcfData, model, members, sv.hours)
+
+    steerValues = np.zeros((len(members), len(hours), 3))
+    for member in members:
+        for j, forecastHour in enumerate(hours):
+            atcfTimeStamp = atcfData[member].iloc[np.where(sv.hours == forecastHour)[0][0]]
+            centerLat, centerLon = atcfTimeStamp["latitude"], atcfTimeStamp["longitude"]
+            winds = stage("getMemberData", sv.loadWinds, model, member, forecastHour)
+            centeredData = stage("getCenterBoxes", lambda: np.sqrt(uf.getCenterBoxes(winds[0], centerLat, centerLon)**2 +
+                                                                   uf.getCenterBoxes(winds[1], centerLat, centerLon)**2))
+            radAvgData = stage("getRadAvgWinds", uf.getRadAvgWinds, centeredData, atcfTimeStamp, model)
+            stage("getDynamicVortex", uf.getDynamicVortex, radAvgData, atcfTimeStamp)
+            steerValues[member, j] = stage("getSteering", sv.getSteering, model, member, forecastHour, winds)
+
+    # correlate the 500mb heights at the first hour to every member's steering speed, the same way RidgeCorrelation does
+    heightData = np.array([rc.loadHeights(member, model, hours[0]).values for member in members])
+    stage("getCorrelation", rc.getCorrelation, heightData, steerValues[:, 0, 0])
+    return steerValues
+
+
+def checkGolden(model, steerValues):
+    # this function compares the steering values to the golden outputs saved by an earlier run, saving them as the golden outputs if there
+    # aren't any yet (or updateGolden is set). The files are written the same way SteerValuesGetter writes them
+    goldenDir = os.path.join(benchDir, "golden", fileFormat)
+    os.makedirs(goldenDir, exist_ok=True)
+    results = {}
+    for i, (name, fmt) in enumerate([("steerSpeed", "%.1f"), ("steerDirection", "%.1f"), ("vortexDepth", "%d")]):
+        goldenPath = os.path.join(goldenDir, f"{model}_{name}.txt")
+        if updateGolden or not os.path.exists(goldenPath):
+            np.savetxt(goldenPath, steerValues[:, :, i], fmt=fmt)
+            results[name] = "saved"
+            continue
+        goldenValues = np.loadtxt(goldenPath, ndmin=2)
+        currentValues = np.array([[float(fmt % value) for value in row] for row in steerValues[:, :, i]])
+        mismatches = int(np.sum(goldenValues != currentValues)) if goldenValues.shape == currentValues.shape else currentValues.size
+        results[name] = "match" if mismatches == 0 else f"{mismatches} values differ"
+    return results
+
+
+def checkFixtureSteering(scale, steerValues):
+    # the steering should recover each member's environmental flow, since the vortex is symmetric. Returns the mean error in knots
+    envWinds = np.array([getFixtureSteering(member) for member in range(scale["members"])])
+    envSpeeds = np.hypot(envWinds[:, 0], envWinds[:, 1]) * 1.94384
+    return float(np.mean(np.abs(steerValues[:, :, 0] - envSpeeds[:, np.newaxis])))
+
+
+def checkCommittedSteering(models=("HFSB_default", "HFSB_tiedtke"), members=range(0, 2)):
+    # this function recomputes the steering for the first few members of the real data and compares it to the committed HFSB_*_steer*.txt
+    # files, returning None if the data on /work2 isn't available
+    if not os.path.exists(uf.getDataPath(models[0], members[0], int(sv.hours[0]))):
+        return None
+    results = {}
+    for model in models:
+        steerValues = np.array([[sv.getSteering(model, member, forecastHour) for forecastHour in sv.hours] for member in members])
+        for i, name in enumerate(["steerSpeed", "steerDirection"]):
+            committedValues = np.loadtxt(f"./{model}_{name}.txt", ndmin=2)[list(members)]
+            mismatches = int(np.sum(np.abs(committedValues - steerValues[:, :, i]) > 0.05))
+            results[f"{model}_{name}"] = "match" if mismatches == 0 else f"{mismatches} values differ"
+    return results
+
+
+def printSummary(results):
+    # prints one row per scale and stage
+    print(f"\n{'scale':<8} {'stage':<17} {'calls':>6} {'total s':>9} {'ms/call':>9} {'cpu %':>6} {'MB/s':>9} {'peak MB':>9}")
+    for scaleName, scaleResults in results["scales"].items():
+        for name, stageTotals in scaleResults["stages"].items():
+            msPerCall = stageTotals["seconds"] / stageTotals["calls"] * 1000
+            cpuPercent = stageTotals["cpuSeconds"] / stageTotals["seconds"] * 100 if stageTotals["seconds"] else 0
+            throughput = stageTotals["bytes"] / 1e6 / stageTotals["seconds"] if stageTotals["seconds"] else 0
+            peakMB = f"{stageTotals['peakMB']:9.1f}" if stageTotals["peakMB"] is not None else f"{'-':>9}"
+            print(f"{scaleName:<8} {name:<17} {stageTotals['calls']:>6} {stageTotals['seconds']:9.3f} {msPerCall:9.2f} {cpuPercent:6.0f} "
+                  f"{throughput:9.1f} {peakMB}")
+        print(f"{scaleName:<8} golden: {scaleResults['golden']}, mean steering error vs. fixture flow: {scaleResults['steeringError']:.2f} kt")
+    if results["committed"] is not None:
+        print(f"committed HFSB_*_steer*.txt: {results['committed']}")
+
+
+if __name__ == "__main__":
+    results = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "fileFormat": fileFormat, "repeats": repeats, "scales": {}, "committed": None}
+
+    # the committed files were made from the real data, so check them before the catalog is pointed at the synthetic data
+    if checkCommitted:
+        results["committed"] = checkCommittedSteering()
+
+    os.makedirs(benchDir, exist_ok=True)
+    cat.catalogPath = os.path.join(benchDir, "catalog.sqlite")
+    cat.indexDir = os.path.join(benchDir, "GribIndexes")
+    for scaleName in runScales:
+        scale = scales[scaleName]
+        model = makeFixtures(scaleName, scale)
+
+        # the fastest of the timed runs is kept for every stage, and then one more run measures each stage's peak memory
+        bestTotals = None
+        for _ in range(repeats):
+            totals, steerValues = timeStages(lambda stage: runPipeline(stage, model, scale))
+            if bestTotals is None:
+                bestTotals = totals
+            else:
+                bestTotals = {name: min(bestTotals[name], totals[name], key=lambda stageTotals: stageTotals["seconds"]) for name in totals}
+        tracemalloc.start()
+        memoryTotals, _ = timeStages(lambda stage: runPipeline(stage, model, scale), traceMemory=True)
+        tracemalloc.stop()
+        for name in bestTotals:
+            bestTotals[name]["peakMB"] = memoryTotals[name]["peakMB"]
+
+        results["scales"][scaleName] = {"scale": scale, "stages": bestTotals, "golden": checkGolden(model, steerValues),
+                                        "steeringError": checkFixtureSteering(scale, steerValues)}
+
+    printSummary(results)
+    resultsPath = os.path.join(benchDir, f"results_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(resultsPath, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"saved {resultsPath}")
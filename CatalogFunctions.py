@@ -0,0 +1,261 @@
+"""
+Name: Catalog Functions
+Author: Nikhil Trivedi
+Description:
+This script keeps an index of every GRIB and ATCF file that's available for the storms, initializations, models, members, and forecast hours
+that the other scripts in this "library" use. Rather than building each file's path from an f-string (and failing on the open if it doesn't
+exist), the data roots are scanned once into a SQLite table keyed by storm, init, model, member, hour, and product, and every lookup after
+that is a dictionary access. It also manages the cfgrib indexes for the GRIB files, keeping them in one shared directory (rather than next to
+the data, which may be read-only) and only loading each one once per process no matter how many filter_by_keys it's opened with. Running this
+script rebuilds the catalog for the roots listed below and pre-builds the index of every GRIB file in it. A list of these functions and a brief
+description of each of them will now be provided:
+1) parseFileName: works out the catalog key of a GRIB or ATCF file from its name and location, returning None for files that aren't data
+2) walkRoot: lists every file under a data root, scanning its directories in parallel threads since most of the time is spent waiting on /work2
+3) buildCatalog: scans the data roots and writes what it finds to the catalog database, replacing anything previously stored for those roots
+4) getCatalog: loads the catalog database into a dictionary once per process so lookups are O(1)
+5) getCatalogPath: returns the path of the file for a storm, init, model, member, forecast hour, and product, or None if it isn't cataloged
+6) getFileIndex: returns a GRIB file's cfgrib index from the shared index directory, building or refreshing it if it's missing or older than the file
+7) openGribDataset: opens one set of filter_by_keys from a GRIB file as an xarray Dataset using the file's index that's already been loaded
+8) buildIndexes: pre-builds the cfgrib indexes of every cataloged GRIB file in parallel so no script ever has to scan a file itself
+Last modified July 31, 2024
+"""
+
+import os
+import re
+import hashlib
+import functools
+import threading
+import sqlite3
+import collections
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import get_context
+import numpy as np
+import ProfilingFunctions as prof
+from LazyImports import LazyModule
+
+# cfgrib and xarray are only imported once a GRIB file is opened, so looking up paths in the catalog stays quick
+xr = LazyModule("xarray")
+cfgrib = LazyModule("cfgrib")
+cfgribDataset = LazyModule("cfgrib.dataset")
+cfgribMessages = LazyModule("cfgrib.messages")
+cfgribPlugin = LazyModule("cfgrib.xarray_plugin")
+
+# the directories that are scanned for data, along with the storm they hold (storm names are lowercase, matching the ATCF files)
+dataRoots = [("ian", "/work2/noaa/aoml-hafs1/ahazelto/student_data/ian_grb2_files"),
+             ("ian", "/work2/noaa/aoml-hafs1/nikhil/ian_ensemble_tracks"),
+             ("ian", "/work2/noaa/aoml-hafs1/nikhil/IanGFSAnalysis"),
+             ("ian", "/work2/noaa/aoml-hafs1/nikhil/bal092022.dat")]
+
+# the cfgrib release series that GribIndexStore is written against. It builds cfgrib's data store from an index that's
+# already loaded, which relies on cfgrib internals (open_from_index and the store's lock/ds attributes), so any other version is opened with
+# cfgrib's own open_dataset instead
+cfgribVersion = "0.9.15"
+
+catalogPath = os.environ.get("HAFS_CATALOG", "./catalog.sqlite") # where the catalog database is stored
+indexDir = os.environ.get("HAFS_INDEX_DIR", "./GribIndexes") # where the cfgrib indexes are stored (can be shared between users)
+
+# file name patterns for each kind of file, with the catalog fields that can be read from them. ATCF track files hold every forecast hour,
+# so they're stored with an hour of -1, and best tracks aren't tied to an initialization so they're stored with an empty init
+filePatterns = {"hafs": re.compile(r"^\w+\.(?P<init>\d{10})\.hfs[ab]\.(?P<product>[\w.]+)\.f(?P<hour>\d{3})\.(?P<model>\w+?)_(?P<member>\d{2})\.(grb2|nc)$"),
+                "gfs": re.compile(r"^\w+\.(?P<init>\d{10})\.gfs\.f(?P<hour>\d{3})\.(?P<model>\w+)\.grb2$"),
+                "track": re.compile(r"^\w+\.(?P<init>\d{10})\.[\w-]+\.(?P<member>\d{2})\.trak\.atcfunix$"),
+                "best": re.compile(r"^b[a-z]{2}\d{2}\d{4}\.dat$")}
+
+CatalogKey = collections.namedtuple("CatalogKey", ["storm", "init", "model", "member", "hour", "product"])
+
+
+def parseFileName(storm, path):
+    # this function returns the catalog key for a data file, or None if the file doesn't match any of the known naming conventions
+    fileName = os.path.basename(path)
+    for kind, pattern in filePatterns.items():
+        match = pattern.match(fileName)
+        if match is None:
+            continue
+        fields = match.groupdict()
+        if kind == "hafs":
+            return CatalogKey(storm, fields["init"], fields["model"], int(fields["member"]), int(fields["hour"]), fields["product"])
+        elif kind == "gfs":
+            # the analysis files are read the same way as the HAFS parent domain, so they share its product name
+            return CatalogKey(storm, fields["init"], fields["model"], 0, int(fields["hour"]), "parent.atm")
+        elif kind == "track":
+            # ensemble tracks are stored under .../{model}/{init}/
+            model = os.path.basename(os.path.dirname(os.path.dirname(path)))
+            return CatalogKey(storm, fields["init"], model, int(fields["member"]), -1, "track")
+        elif kind == "best":
+            return CatalogKey(storm, "", "best", 0, -1, "track")
+    return None
+
+
+def scanDirectory(path):
+    # lists one directory, returning its files (with their modification times and sizes) and its subdirectories
+    files, directories = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=True):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=True):
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_mtime, stat.st_size))
+    except (PermissionError, FileNotFoundError):
+        pass
+    return files, directories
+
+
+def walkRoot(root, workers=16):
+    # this function returns (path, mtime, size) for every file under root, listing up to workers directories at once
+    if os.path.isfile(root):
+        stat = os.stat(root)
+        return [(root, stat.st_mtime, stat.st_size)]
+
+    files = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(scanDirectory, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                newFiles, directories = future.result()
+                files.extend(newFiles)
+                pending.update(pool.submit(scanDirectory, directory) for directory in directories)
+    return files
+
+
+def buildCatalog(roots=None, path=None, workers=16):
+    # this function scans every data root and stores what it finds in the catalog database, returning the number of files cataloged. The
+    # roots are given as (storm, directory) pairs, and the rows from any earlier scan of the same roots are replaced
+    roots = dataRoots if roots is None else roots
+    path = catalogPath if path is None else path
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS files (storm TEXT, init TEXT, model TEXT, member INTEGER, hour INTEGER, product TEXT, "
+                           "path TEXT, mtime REAL, size INTEGER, root TEXT, PRIMARY KEY (storm, init, model, member, hour, product))")
+        fileCount = 0
+        for storm, root in roots:
+            rows = []
+            for filePath, mtime, size in walkRoot(root, workers):
+                key = parseFileName(storm, filePath)
+                if key is not None:
+                    rows.append(tuple(key) + (filePath, mtime, size, root))
+            connection.execute("DELETE FROM files WHERE root = ?", (root,))
+            connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            fileCount += len(rows)
+            print(f"cataloged {len(rows)} files in {root}")
+    connection.close()
+    getCatalog.cache_clear()
+    return fileCount
+
+
+@functools.lru_cache(maxsize=None)
+def getCatalog(path=None):
+    # this function reads the whole catalog into a {CatalogKey: path} dictionary, returning an empty one if no catalog has been built
+    path = catalogPath if path is None else path
+    if not os.path.exists(path):
+        return {}
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute("SELECT storm, init, model, member, hour, product, path FROM files").fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    connection.close()
+    return {CatalogKey(*row[:6]): row[6] for row in rows}
+
+
+def getCatalogPath(storm, init, model, member, hour, product):
+    # this function returns the cataloged path for a file, or None if there isn't one (including when no catalog has been built)
+    return getCatalog().get(CatalogKey(storm, init, model, member, hour, product))
+
+
+def getIndexPath(path):
+    # the index's file name includes a hash of the GRIB file's full path, since files in different directories can have the same name
+    pathHash = hashlib.md5(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(indexDir, f"{os.path.basename(path)}.{pathHash}.idx")
+
+
+@functools.lru_cache(maxsize=None)
+def getIndexKeys():
+    # every index is built with the same keys, which include all of the keys used in filter_by_keys, so any filter set can be applied to it
+    return sorted(set(cfgribDataset.compute_index_keys()) | {"typeOfLevel", "stepType"})
+
+
+@functools.lru_cache(maxsize=64)
+def loadFileIndex(path, mtime):
+    # the modification time is part of the cache key so a file that's been rewritten gets indexed again
+    indexPath = getIndexPath(path)
+    os.makedirs(indexDir, exist_ok=True)
+
+    # cfgrib won't replace an index that's older than its GRIB file (it just re-scans the file on every open), so stale ones are removed
+    try:
+        if os.path.getmtime(indexPath) < mtime:
+            os.remove(indexPath)
+    except FileNotFoundError:
+        pass
+    stream = cfgribMessages.FileStream(path)
+    return cfgribDataset.open_fileindex(stream, indexPath, getIndexKeys())
+
+
+# a lock for each GRIB file, so that prefetch threads asking for the same file's index at once don't both build and write it
+indexLocks, indexLocksLock = collections.defaultdict(threading.Lock), threading.Lock()
+
+
+def getFileIndex(path):
+    # this function returns the cfgrib index for a GRIB file, reading it from the index directory (or building it there) only once per process
+    with indexLocksLock:
+        pathLock = indexLocks[os.path.abspath(path)]
+    with pathLock:
+        hits = loadFileIndex.cache_info().hits
+        index = loadFileIndex(path, os.path.getmtime(path))
+        prof.count("indexCacheHits" if loadFileIndex.cache_info().hits > hits else "indexCacheMisses")
+    return index
+
+
+@functools.lru_cache(maxsize=None)
+def isCfgribSupported():
+    # whether the installed cfgrib is the release series that GribIndexStore was written against
+    return cfgrib.__version__ == cfgribVersion or cfgrib.__version__.startswith(cfgribVersion + ".")
+
+
+@functools.lru_cache(maxsize=None)
+def getGribIndexStore():
+    # the data store class can only be made once cfgrib has been imported, so it's made the first time a GRIB file is opened
+    class GribIndexStore(cfgribPlugin.CfGribDataStore):
+        # a cfgrib data store made from an index that's already loaded, rather than from a path that would have its index read again
+        def __init__(self, index, valuesDtype="float32"):
+            self.lock = cfgribPlugin.ECCODES_LOCK
+            self.ds = cfgribDataset.open_from_index(index, values_dtype=np.dtype(valuesDtype))
+    return GribIndexStore
+
+
+def openGribDataset(path, filterByKeys, valuesDtype="float32"):
+    # this function is the same as xr.open_dataset(path, engine='cfgrib', filter_by_keys=filterByKeys), but every filter set opened from the
+    # same file shares one in-memory index, and that index is kept in the index directory rather than next to the file. The fields are
+    # decoded as valuesDtype. With a cfgrib version that GribIndexStore hasn't been checked against, cfgrib opens the file itself (still keeping
+    # its index in the index directory, but reading it again for every filter set)
+    if not isCfgribSupported():
+        indexPath = getIndexPath(path)[:-len(".idx")] + ".{short_hash}.idx"
+        return xr.open_dataset(path, engine="cfgrib", filter_by_keys=filterByKeys, indexpath=indexPath, values_dtype=np.dtype(valuesDtype))
+    index = getFileIndex(path).subindex(filterByKeys)
+    return xr.open_dataset(getGribIndexStore()(index, valuesDtype))
+
+
+def writeFileIndex(path):
+    # runs in the worker processes for buildIndexes
+    getFileIndex(path)
+    return path
+
+
+def buildIndexes(paths=None, processes=None):
+    # this function builds the index of every GRIB file in the catalog (or the given paths) that doesn't have an up-to-date one yet, returning
+    # the number of files that were indexed
+    if paths is None:
+        paths = [path for key, path in getCatalog().items() if key.product != "track" and path.endswith(".grb2")]
+    paths = [path for path in paths if not os.path.exists(getIndexPath(path)) or os.path.getmtime(getIndexPath(path)) < os.path.getmtime(path)]
+    os.makedirs(indexDir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context('fork')) as pool:
+        for path in pool.map(writeFileIndex, paths):
+            print(f"indexed {path}")
+    return len(paths)
+
+
+if __name__ == "__main__":
+    buildCatalog()
+    buildIndexes()
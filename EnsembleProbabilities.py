@@ -0,0 +1,79 @@
+"""
+Name: Ensemble Strike Probability Script
+Author: Nikhil Trivedi
+Description:
+This script turns each scheme's ensemble tracks into probabilistic maps rather than individual lines. For every forecast window, the strike
+probability is the percent of members whose center passes within a radius of each grid point, and the track density is the number of hours
+per member that the center spends within that radius. The maps for every scheme are saved to one NetCDF file per scheme, and the product of
+choice is plotted for each window. Below is a namelist with parameters that can be modified to whatever is of interest. Descriptions of each
+of the parameters are commented to the right of them.
+Last modified July 31, 2024
+"""
+
+###################################################################################################################################
+# adjust these parameters based on your needs
+models = ["HFSB_default", "HFSB_tiedtke"] # schemes to make maps for
+members = range(0, 31) # ensemble members to include (range(0, 31) indicates all members)
+hours = [0, 24, 48, 60, 72, 84, 96, 108, 120] # hours to pull from ATCF file
+windows = [(0, 24), (24, 48), (48, 72), (72, 120), (0, 120)] # forecast windows (start hour, end hour) to make maps for (end hours count in the next one)
+radius = 120 # distance (km) from the TC center that counts as a strike
+stepHours = 1 # spacing (hours) that the tracks are interpolated to before they're rasterized
+gridSpacing = 0.1 # spacing (degrees) of the grid the tracks are rasterized onto
+extent = [260, 310, 10, 45] # west, east, south, north bounds of the grid (the same as the regional domain)
+product = "strikeProbability" # product to plot (strikeProbability or trackDensity)
+year, month, day, hour = 2022, 9, 24, 0  # initialization date
+###################################################################################################################################
+
+import numpy as np
+import cartopy.crs as ccrs
+import matplotlib.pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap
+import UsefulFunctions as uf
+import PlottingFunctions as pf
+
+# dictionaries for conversions
+monthsDict = {1: "January", 2: "February", 3: "March", 4: "April", 5: "May", 6: "June", 7: "July", 8: "August",
+              9: "September", 10: "October", 11: "November", 12: "December"}
+
+productDict = {"strikeProbability": ["Strike Probability", "Probability (%)", 100, np.arange(5, 105, 5)],
+               "trackDensity": ["Track Density", "Hours Per Member", 1, np.arange(0.5, 24.5, 0.5)]}
+
+
+def makeProbabilityPlot(probabilityData, model, window):
+    # this function draws one window of a scheme's strike probability or track density map and returns the figure
+    name, units, scale, levels = productDict[product]
+    windowData = probabilityData[product].sel(window=window) * scale
+    fig, ax = pf.getBaseFigure(figsize=(10, 6), extent=extent)
+
+    newcmp = LinearSegmentedColormap.from_list("", [
+        (0 / 20, "#FFFFFF"),
+        (4 / 20, "#22B2FF"),
+        (8 / 20, "#104CE1"),
+        (12 / 20, "#FEC024"),
+        (16 / 20, "#E12309"),
+        (20 / 20, "#B885FF")])
+    contourf = ax.contourf(windowData.longitude, windowData.latitude, windowData, levels, extend='max', transform=ccrs.PlateCarree(), cmap=newcmp)
+    cbar = plt.colorbar(contourf, pad=0.015, aspect=25, shrink=0.72, ax=ax)
+    cbar.ax.tick_params(labelsize=8)
+    cbar.set_label(units, fontsize=8)
+
+    # add titling
+    start, end = probabilityData.windowStart.sel(window=window).item(), probabilityData.windowEnd.sel(window=window).item()
+    title = f"{model} {name} Within {radius} km, Hours {start}-{end}"
+    subTitle = f"\n{probabilityData.attrs['members']} Members, Initialized at {hour:02}Z {monthsDict[month]} {day:02} {year}"
+    ax.set_title(title + subTitle, fontsize=9, weight='bold', loc='left')
+    return fig
+
+
+if __name__ == "__main__":
+    # the grid runs south to north like the regional domain, but only the track files are read so it doesn't come from a GRIB file
+    gridLats = np.arange(extent[2], extent[3] + gridSpacing / 2, gridSpacing)
+    gridLons = np.arange(extent[0], extent[1] + gridSpacing / 2, gridSpacing)
+    for model in models:
+        atcfData = uf.getAtcfData(model, members, hours)
+        probabilityData = uf.getTrackProbabilities(atcfData, hours, gridLats, gridLons, radius, windows, stepHours)
+        probabilityData.to_netcdf(f"./ProbabilityMaps/{model}_trackProbabilities.nc")
+
+        for window in probabilityData.window.values:
+            makeProbabilityPlot(probabilityData, model, window)
+            plt.savefig(f"./ProbabilityMaps/{product}_{model}_{window}.png", dpi=300, bbox_inches='tight')
@@ -12,6 +12,7 @@ Last modified July 31, 2024
 # adjust these parameters depending on your needs
 forecastHour = 48 # forecast hour to use
 clusterType = "MSLP" # track, MSLP, R34, speed, direction, steerSpeed, steerDirection, vortexDepth
+clusterMethod = "rank" # rank (color members by clusterType), or hierarchical/kmedoids to color the two clusters from full track distances
 hours = [0, 24, 48, 60, 72, 84, 96, 108, 120] # hours to pull from ATCF file
 members = range(0, 31) # ensemble members to include
 year, month, day, hour = 2022, 9, 24, 0  # date to be plotted
@@ -20,10 +21,10 @@ year, month, day, hour = 2022, 9, 24, 0  # date to be plotted
 import pandas as pd
 import numpy as np
 import cartopy.crs as ccrs
-import cartopy.feature as cf
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 import UsefulFunctions as uf
+import PlottingFunctions as pf
 
 # dictionaries for conversions
 monthsDict = {1: "January", 2: "February", 3: "March", 4: "April", 5: "May", 6: "June", 7: "July", 8: "August",
@@ -36,20 +37,7 @@ hours = np.array(hours)
 
 
 def mapping(ax, model):
-    # plot cartopy map and various features
-    ax.set_extent([270, 295, 12, 32])
-    ax.add_feature(cf.LAND)
-    ax.add_feature(cf.STATES, linewidth=0.2, edgecolor="gray")
-    ax.add_feature(cf.BORDERS, linewidth=0.3)
-    ax.coastlines(linewidth=0.5, resolution='50m')
-
-    # plot gridlines
-    gl = ax.gridlines(crs=ccrs.PlateCarree(), draw_labels=True, linewidth=1, color='gray', alpha=0.5, linestyle='--')
-    gl.top_labels = gl.right_labels = False
-    gl.xlabel_style = {'size': 7, 'weight': 'bold', 'color': 'gray'}
-    gl.ylabel_style = {'size': 7, 'weight': 'bold', 'color': 'gray'}
-
-    # plot title
+    # plot title (the map itself comes from getBaseFigure)
     capClusterType = clusterType[0].upper() + clusterType[1:]
     title = f"HAFS {model} Ensembles by {capClusterType} at Hour {forecastHour}"
     subTitle = f"\nInitialized at {hour:02}Z {monthsDict[month]} {day:02} {year}"
@@ -63,6 +51,18 @@ def mapping(ax, model):
     ax.legend(custom_markers, [typeDict[clusterType][0], typeDict[clusterType][1]])
 
 
+def getMemberColors(schemeFrames, schemePos):
+    # returns the color of each member in rank order. With clusterMethod set to hierarchical or kmedoids, the members are split into two
+    # clusters on their full track distances rather than the clusterType value, and each cluster gets one end of the colormap (ordered by
+    # the clusters' average rank so typeDict's names still apply)
+    schemeOrder = np.array(schemePos).argsort()
+    if clusterMethod == "rank":
+        return colors[:len(schemeOrder)]
+    trackLabels = uf.getTrackClusters(uf.getTrackDistances(schemeFrames), 2, clusterMethod)
+    labelOrder = np.argsort([np.array(schemePos)[trackLabels == label].mean() for label in range(2)])
+    return np.array([colors[0] if label == labelOrder[0] else colors[-1] for label in trackLabels[schemeOrder]])
+
+
 colors = plt.cm.viridis(np.linspace(0, 1, 31))
 defaultFrames, tiedtkeFrames, endLongs = [], [], []
 
@@ -81,26 +81,29 @@ if clusterType in ["steerSpeed", "steerDirection", "vortexDepth"]:
 defaultPos = uf.getClusterRanks(defaultFrames, hours, forecastHour, clusterType)
 tiedtkePos = uf.getClusterRanks(tiedtkeFrames, hours, forecastHour, clusterType)
 
+defaultColors = getMemberColors(defaultFrames, defaultPos)
+tiedtkeColors = getMemberColors(tiedtkeFrames, tiedtkePos)
+
 defaultOrder = np.array(defaultPos).argsort()
 tiedtkeOrder = np.array(tiedtkePos).argsort()
 
 defaultFrames = np.array(defaultFrames)[defaultOrder]
 tiedtkeFrames = np.array(tiedtkeFrames)[tiedtkeOrder]
 
-fig, axes = plt.subplots(1, 2, subplot_kw={'projection': ccrs.PlateCarree(central_longitude=180)}, figsize=(10, 6))
+fig, axes = pf.getBaseFigure(1, 2, figsize=(10, 6), extent=[270, 295, 12, 32])
 index = np.where(hours == forecastHour)[0][0]
+mapping(axes[0], "Default")
+mapping(axes[1], "Tiedtke")
 for member in members:
     # plot data
     ax = axes[0]
-    mapping(ax, "Default")
-    ax.plot(defaultFrames[member][:, 1], defaultFrames[member][:, 0], transform=ccrs.PlateCarree(), color=colors[member], linewidth=1.2)
+    ax.plot(defaultFrames[member][:, 1], defaultFrames[member][:, 0], transform=ccrs.PlateCarree(), color=defaultColors[member], linewidth=1.2)
     ax.scatter(defaultFrames[member][:, 1][index], defaultFrames[member][:, 0][index], transform=ccrs.PlateCarree(), color='black', zorder=100, s=20)
 
 for member in members:
     # plot data
     ax = axes[1]
-    mapping(ax, "Tiedtke")
-    ax.plot(tiedtkeFrames[member][:, 1], tiedtkeFrames[member][:, 0], transform=ccrs.PlateCarree(), color=colors[member], linewidth=1.2)
+    ax.plot(tiedtkeFrames[member][:, 1], tiedtkeFrames[member][:, 0], transform=ccrs.PlateCarree(), color=tiedtkeColors[member], linewidth=1.2)
     ax.scatter(tiedtkeFrames[member][:, 1][index], tiedtkeFrames[member][:, 0][index], transform=ccrs.PlateCarree(), color='black', zorder=100, s=20)
 
 plt.savefig(rf"/work2/noaa/aoml-hafs1/nikhil/LinePlots/ensemble_tracks_{forecastHour}.png", dpi=300, bbox_inches='tight')
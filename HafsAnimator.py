@@ -0,0 +1,77 @@
+"""
+Name: HAFS Forecast Hour Animator
+Author: Nikhil Trivedi
+Description:
+This script animates the HafsDataPlotter maps through the forecast hours and saves the loop as an MP4 or GIF. The figure, map features, and
+colorbar are only made once, and each frame just swaps out the data layers and the title. While one frame is being drawn, the data for the
+next forecast hour is read in the background. Below is a namelist with parameters that can be modified to whatever is of interest.
+Descriptions of each of the parameters are commented to the right of them.
+Last modified July 31, 2024
+"""
+
+###################################################################################################################################
+# adjust these parameters based on your needs
+variable = "height"  # variable to plot (check varDict in UsefulFunctions for supported variables, or vector wind)
+level = 500 # atmospheric level to plot for (if applicable)
+hours = [0, 6, 12, 18, 24, 48, 60, 72, 84, 96, 108, 120] # forecast hours to include in the animation
+model = "HFSB_default" # HFSA_default  HFSB_default  HFSB_progsigma  HFSB_ras  HFSB_tiedtke  GFS_analysis
+runType = "control" # control or mean
+outputFormat = "mp4" # mp4 (needs ffmpeg) or gif
+fps = 2 # frames per second
+dpi = 150 # resolution of each frame
+decimate = True # coarsen the data to the frame's resolution before plotting (False plots the full grid)
+###################################################################################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.animation import FFMpegWriter, PillowWriter
+import PlottingFunctions as pf
+import HafsDataPlotter as dp
+
+
+def animate(path):
+    # this function writes the animation to the given path, building the figure once and then only replacing the data each frame
+    if runType == "control":
+        members = range(0, 1)
+    elif runType == "mean":
+        members = range(0, 31)
+
+    fig, ax = pf.getBaseFigure(figsize=(10, 6))
+    writer = FFMpegWriter(fps=fps) if outputFormat == "mp4" else PillowWriter(fps=fps)
+
+    with ThreadPoolExecutor(max_workers=1) as pool, writer.saving(fig, path, dpi):
+        nextData = pool.submit(dp.getPlotData, model, variable, members, hours[0], level)
+        dataLayers = []
+        for i, forecastHour in enumerate(hours):
+            varData, zonalData, meridionalData = nextData.result()
+
+            # start reading the next forecast hour while this frame is drawn
+            if i + 1 < len(hours):
+                nextData = pool.submit(dp.getPlotData, model, variable, members, hours[i + 1], level)
+
+            scale, levelsContour, levelsContourf, newcmp, title = dp.getPlotStyle(model, variable, level, forecastHour)
+            varData = pf.getDisplayData(varData / scale, ax, dpi, enabled=decimate)
+            if zonalData is not None:
+                zonalData = pf.getDisplayData(zonalData, ax, dpi, vector=True, enabled=decimate)
+                meridionalData = pf.getDisplayData(meridionalData, ax, dpi, vector=True, enabled=decimate)
+
+            # swap out the previous frame's data layers for this frame's
+            for artist in dataLayers:
+                artist.remove()
+            baseChildren = set(ax.get_children())
+            contourf = dp.plotDataLayers(varData, variable, levelsContour, levelsContourf, newcmp, zonalData, meridionalData)
+            dataLayers = [child for child in ax.get_children() if child not in baseChildren]
+
+            # the contour levels are fixed for each variable, so the colorbar from the first frame is valid for all of them
+            if i == 0:
+                cbar = plt.colorbar(contourf, pad=0.015, aspect=27, shrink=0.8, ax=ax)
+                cbar.ax.tick_params(labelsize=8)
+            ax.set_title(title, fontsize=9, weight='bold', loc='left')
+            writer.grab_frame()
+            print(f"rendered hour {forecastHour}")
+
+
+if __name__ == "__main__":
+    animate(f"./Animations/{variable}_{runType}_animation_{model}_{level}mb.{outputFormat}")
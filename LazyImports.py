@@ -0,0 +1,22 @@
+"""
+Name: Lazy Imports
+Author: Nikhil Trivedi
+Description:
+This script holds the stand-in that the other scripts in this "library" use for the packages that are slow to import (xarray, cfgrib, scipy,
+cartopy, matplotlib), so that the compute-only tools and worker processes don't wait on packages they never use. It only imports the standard
+library, so any script can use it without a circular import. A list of these functions and a brief description of each of them will now be
+provided:
+1) LazyModule: stands in for a module that's slow to import, only importing it once one of its attributes is actually used
+Last modified July 31, 2024
+"""
+
+import importlib
+
+
+class LazyModule:
+    # this class stands in for a module, importing it the first time one of its attributes is used rather than when the script is imported
+    def __init__(self, name):
+        self.__dict__['name'] = name
+
+    def __getattr__(self, attribute):
+        return getattr(importlib.import_module(self.name), attribute)
@@ -0,0 +1,187 @@
+"""
+Name: Parallel Functions
+Author: Nikhil Trivedi
+Description:
+This script contains functions for speeding up the long loops over models, members, and forecast hours in the other scripts of this "library".
+Most of the time in those loops is spent waiting on GRIB files from /work2, so these functions overlap the reading with the computation. A list
+of these functions and a brief description of each of them will now be provided:
+1) getResultBytes: estimates how much memory a loaded result (DataArray, numpy array, or a tuple/list/dict of them) takes up
+2) getPrefetched: loops over a list of items in order, reading the next few of them on background threads while the current one is processed
+3) getSharedStack: loads a list of items in a pool of processes, with each process writing its result straight into one shared (item, ...) array
+4) releaseSharedData: frees getSharedStack's shared memory once the parent process is done with it
+5) runTasks: runs a function over a list of items serially, in a process pool, or on a dask cluster (local or through Slurm), returning the
+   results in the same order as the serial path would
+Last modified July 31, 2024
+"""
+
+import collections
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory, get_context
+import numpy as np
+from LazyImports import LazyModule
+
+# xarray is only needed to wrap shared memory as a DataArray, so it isn't imported until then
+xr = LazyModule("xarray")
+
+
+def getResultBytes(result):
+    # this function adds up the size of every array within a loaded result
+    if isinstance(result, (tuple, list)):
+        return sum(getResultBytes(value) for value in result)
+    if isinstance(result, dict):
+        return sum(getResultBytes(value) for value in result.values())
+    return getattr(result, 'nbytes', 0)
+
+
+def getPrefetched(items, loadFunc, depth=2, workers=2, maxBytes=None):
+    # this function yields (item, loadFunc(*item)) for every item in order, keeping up to depth items being read ahead of the one being
+    # processed. If maxBytes is given, no more reads are started once the results waiting to be processed (plus the reads still in progress,
+    # estimated from the average result size) would go over it. loadFunc should return loaded data rather than lazy arrays
+    items = [item if isinstance(item, tuple) else (item,) for item in items]
+    pending = collections.deque()
+    nextIdx, loadedCount, loadedBytes = 0, 0, 0
+
+    def getQueuedBytes():
+        # finished reads are counted exactly, unfinished ones with the average size of what has been read so far
+        averageBytes = loadedBytes / loadedCount if loadedCount else 0
+        return sum(getResultBytes(future.result()) if future.done() and not future.exception() else averageBytes for _, future in pending), averageBytes
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while pending or nextIdx < len(items):
+            while nextIdx < len(items) and len(pending) <= depth:
+                if pending and maxBytes is not None:
+                    # until one result has been loaded there's no way to know how big they are, so only read one at a time
+                    queuedBytes, averageBytes = getQueuedBytes()
+                    if not loadedCount or queuedBytes + averageBytes > maxBytes:
+                        break
+                pending.append((items[nextIdx], pool.submit(loadFunc, *items[nextIdx])))
+                nextIdx += 1
+
+            item, future = pending.popleft()
+            result = future.result()
+            loadedCount += 1
+            loadedBytes += getResultBytes(result)
+            yield item, result
+    finally:
+        # don't start any reads that haven't begun if the loop is stopped early
+        for _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def getSharedMetadata(shm, shape, varData, dims):
+    # the metadata that's sent between processes in place of the data itself
+    return {'name': shm.name, 'shape': shape, 'dtype': varData.dtype.str, 'dims': dims, 'varName': varData.name,
+            'coords': {coord: (varData[coord].dims, varData[coord].values) for coord in varData.coords}, 'attrs': varData.attrs}
+
+
+def openSharedData(metadata):
+    # this function returns a DataArray that views the shared memory directly along with the handle keeping it open, which must be passed
+    # to releaseSharedData (or closed) once the DataArray is no longer needed
+    shm = shared_memory.SharedMemory(name=metadata['name'])
+    values = np.ndarray(metadata['shape'], dtype=np.dtype(metadata['dtype']), buffer=shm.buf)
+    varData = xr.DataArray(values, dims=metadata['dims'], coords=metadata['coords'], name=metadata['varName'], attrs=metadata['attrs'])
+    return varData, shm
+
+
+def releaseSharedData(shm):
+    # this function frees the shared memory, so any DataArrays viewing it have to be deleted (or copied) before it's called
+    shm.close()
+    shm.unlink()
+
+
+def fillSharedSlot(metadata, index, loadFunc, item):
+    # runs in the worker processes for getSharedStack, writing one loaded result into its slot of the shared array
+    shm = shared_memory.SharedMemory(name=metadata['name'])
+    values = np.ndarray(metadata['shape'], dtype=np.dtype(metadata['dtype']), buffer=shm.buf)
+    values[index] = loadFunc(*item)
+    del values
+    shm.close()
+
+
+def getSharedStack(loadFunc, items, dim='member', processes=None):
+    # this function loads every item with loadFunc (which has to be a module-level function returning a DataArray of the same shape for
+    # every item) in a pool of processes. Each worker writes straight into one shared array, so the parent gets the stacked data without any
+    # pickling or concatenation copies. Returns the stacked DataArray and its shared memory handle for releaseSharedData
+    items = [item if isinstance(item, tuple) else (item,) for item in items]
+
+    # the first item is loaded here to find the shape, type, and coordinates of the stack
+    firstData = loadFunc(*items[0])
+    shape = (len(items),) + firstData.shape
+    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * firstData.dtype.itemsize, 1))
+    metadata = getSharedMetadata(shm, shape, firstData, (dim,) + firstData.dims)
+    shm.close()
+    stackData, shm = openSharedData(metadata)
+    stackData.values[0] = firstData.values
+
+    try:
+        # the workers are forked so they start with the modules, catalog lookups, and GRIB indexes the parent has already loaded rather than
+        # importing everything again
+        with ProcessPoolExecutor(max_workers=processes, mp_context=get_context('fork')) as pool:
+            futures = [pool.submit(fillSharedSlot, metadata, i, loadFunc, item) for i, item in enumerate(items) if i > 0]
+            for future in futures:
+                future.result()
+    except BaseException:
+        del stackData
+        releaseSharedData(shm)
+        raise
+    return stackData, shm
+
+
+def runGroup(taskFunc, groupItems, retries=0):
+    # runs every item of a locality group one after another on the same worker, retrying failed items
+    results = []
+    for item in groupItems:
+        for attempt in range(retries + 1):
+            try:
+                results.append(taskFunc(*item))
+                break
+            except Exception:
+                if attempt == retries:
+                    raise
+    return results
+
+
+def runTasks(taskFunc, items, backend="serial", workers=None, retries=2, localityKey=None, clusterKwargs=None):
+    # this function runs taskFunc(*item) for every item and returns the results in the order of items, no matter which backend is used:
+    # serial (in this process), processes (a forked process pool), dask-local (a dask LocalCluster on this machine), or dask-slurm (a
+    # dask_jobqueue SLURMCluster with workers submitted as jobs, configured with clusterKwargs). Items that share the same localityKey(item)
+    # (e.g. the same model and member) are sent to one worker together, so that worker's cached ATCF data and GRIB indexes get reused.
+    # Failed items are retried up to retries times on every backend. The dask backends need the calling script to have a __main__ guard
+    items = [item if isinstance(item, tuple) else (item,) for item in items]
+    if backend == "serial":
+        return runGroup(taskFunc, items, retries)
+
+    # group the items by locality, remembering where each one came from so the results can be put back in order
+    groups = collections.defaultdict(list)
+    for i, item in enumerate(items):
+        groups[localityKey(item) if localityKey is not None else i].append(i)
+    groupIdx = list(groups.values())
+    groupItems = [[items[i] for i in idx] for idx in groupIdx]
+
+    if backend == "processes":
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('fork')) as pool:
+            groupResults = list(pool.map(runGroup, [taskFunc] * len(groupItems), groupItems, [retries] * len(groupItems)))
+
+    elif backend in ["dask-local", "dask-slurm"]:
+        from dask.distributed import Client, LocalCluster
+        if backend == "dask-local":
+            cluster = LocalCluster(n_workers=workers, threads_per_worker=1, **(clusterKwargs or {}))
+        else:
+            from dask_jobqueue import SLURMCluster
+            cluster = SLURMCluster(**(clusterKwargs or {}))
+            cluster.scale(workers or 1)
+        with cluster, Client(cluster) as client:
+            # retries goes to runGroup so only the failed item is run again, rather than dask re-running the whole group
+            futures = client.map(runGroup, [taskFunc] * len(groupItems), groupItems, [retries] * len(groupItems), pure=False)
+            groupResults = client.gather(futures)
+
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    results = [None] * len(items)
+    for idx, resultList in zip(groupIdx, groupResults):
+        for i, result in zip(idx, resultList):
+            results[i] = result
+    return results
@@ -0,0 +1,149 @@
+"""
+Name: Plotting Functions
+Author: Nikhil Trivedi
+Description:
+This script contains the cartopy map functions that are shared by all of the plotting scripts in this "library". Loading and clipping the
+Natural Earth geometries is one of the slowest parts of making a figure, so the geometries are loaded once per map extent and reused by every
+panel and figure, and a figure's background is only drawn once per layout. A list of these functions and a brief description of each of
+them will now be provided:
+1) getMapFeatures: loads the land, state, border, and coastline geometries clipped to a map extent, caching them so it's only done once per extent
+2) addBaseMap: draws the standard map background and styled gridlines onto an axis using the cached features
+3) getBaseFigure: returns a figure with the base map already drawn on every panel, reusing the figure that was made for the same layout
+4) clearDataLayers: removes everything plotted on top of the base map (data, titles, colorbars, legends) so a figure can be reused
+5) getDisplayData: coarsens a field to the resolution it can actually be seen at (area mean for scalars, thinning for vectors) before plotting
+Last modified July 31, 2024
+"""
+
+import functools
+import numpy as np
+import cartopy.crs as ccrs
+import cartopy.feature as cf
+import matplotlib.pyplot as plt
+from shapely.geometry import box
+
+# the regional domain that getMemberData subsets to, used to clip the map features when a plot doesn't set its own extent
+domainExtent = (260, 310, 10, 45)
+
+# the base map figures that have already been made, along with what was on them before any data was plotted
+baseFigures, baseLayers = {}, {}
+
+
+@functools.lru_cache(maxsize=None)
+def getMapFeatures(extent=domainExtent, resolution='50m'):
+    # this function loads the map features once per extent, clipped (with a small buffer) so only the geometry in view is ever drawn
+    west, east, south, north = extent
+    west, east = (west + 180) % 360 - 180, (east + 180) % 360 - 180
+    bounds = (west - 1, east + 1, south - 1, north + 1)
+    clipBox = box(bounds[0], bounds[2], bounds[1], bounds[3])
+
+    styles = {"land": (cf.LAND, cf.LAND.kwargs),
+              "states": (cf.STATES, {'linewidth': 0.2, 'edgecolor': "gray", 'facecolor': 'none'}),
+              "borders": (cf.BORDERS, {'linewidth': 0.3, 'edgecolor': 'black', 'facecolor': 'none'}),
+              "coastlines": (cf.COASTLINE, {'linewidth': 0.5, 'edgecolor': 'black', 'facecolor': 'none'})}
+    features = {}
+    for name, (feature, style) in styles.items():
+        geometries = [geometry.intersection(clipBox) for geometry in feature.with_scale(resolution).intersecting_geometries(bounds)]
+        geometries = [geometry for geometry in geometries if not geometry.is_empty]
+        features[name] = cf.ShapelyFeature(geometries, ccrs.PlateCarree(), **style)
+    return features
+
+
+def addBaseMap(ax, extent=None):
+    # this function draws the land, states, borders, coastlines, and gridlines that every map in this library uses
+    if extent is not None:
+        ax.set_extent(extent)
+    for feature in getMapFeatures(tuple(extent) if extent is not None else domainExtent).values():
+        ax.add_feature(feature)
+
+    # plot gridlines
+    gl = ax.gridlines(crs=ccrs.PlateCarree(), draw_labels=True, linewidth=1, color='gray', alpha=0.5, linestyle='--')
+    gl.top_labels = gl.right_labels = False
+    gl.xlabel_style = {'size': 7, 'weight': 'bold', 'color': 'gray'}
+    gl.ylabel_style = {'size': 7, 'weight': 'bold', 'color': 'gray'}
+    return gl
+
+
+def getBaseFigure(nrows=1, ncols=1, figsize=(10, 6), extent=None):
+    # this function returns a figure and its axes (like plt.subplots) with the base map on every panel, only drawing the background once
+    # per layout. If the figure for this layout is still open, whatever was plotted on it last time is cleared and it's reused
+    key = (nrows, ncols, tuple(figsize), tuple(extent) if extent is not None else None)
+    if key in baseFigures and plt.fignum_exists(baseFigures[key][0].number):
+        fig, axes = baseFigures[key]
+        clearDataLayers(fig)
+    else:
+        fig, axes = plt.subplots(nrows, ncols, subplot_kw={'projection': ccrs.PlateCarree(central_longitude=180)}, figsize=figsize)
+        for ax in np.atleast_1d(axes).flatten():
+            addBaseMap(ax, extent)
+
+        # remember what the figure looked like before any data was added
+        baseLayers[fig] = {ax: (set(ax.get_children()), ax.get_subplotspec(), ax.get_position(original=True)) for ax in fig.axes}
+        baseFigures[key] = (fig, axes)
+
+    # make the figure current so the plt.* calls in the scripts draw on it
+    plt.figure(fig.number)
+    plt.sca(np.atleast_1d(axes).flatten()[0])
+    return fig, axes
+
+
+def clearDataLayers(fig):
+    # this function removes everything that was plotted after the base map was drawn, restoring the figure's original layout
+    for ax in list(fig.axes):
+        if ax not in baseLayers[fig]:
+            # colorbars and any other added axes
+            fig.delaxes(ax)
+            continue
+
+        baseChildren, subplotSpec, position = baseLayers[fig][ax]
+        for child in ax.get_children():
+            if child not in baseChildren:
+                child.remove()
+        for loc in ['left', 'center', 'right']:
+            ax.set_title('', loc=loc)
+
+        # colorbars steal space from their parent axis, so put it back where it was
+        if subplotSpec is not None:
+            ax.set_subplotspec(subplotSpec)
+        ax.set_position(position)
+
+
+def getDisplayData(varData, ax=None, dpi=300, vector=False, vectorSpacing=10, enabled=True, resolution=None):
+    # this function coarsens a field so it has about one grid point per pixel of the axis it will be drawn on, since contouring detail that
+    # can't be seen at the given dpi is slow. Scalars are area-averaged (with cos(latitude) weights), while vectors (e.g. for streamplot) are
+    # thinned to one point every vectorSpacing pixels. At the saved 300 dpi an axis is usually about as many pixels wide as the 0.02 degree
+    # regional grid has points, so scalars are mostly only reduced at lower dpi (e.g. the quick-look and animation frames). Giving a resolution
+    # in degrees also averages scalars into blocks at least that size (0.1 is 5x5 points on the regional grid) whenever that's coarser than a
+    # pixel. Setting enabled to False returns the full-resolution field
+    if not enabled:
+        return varData
+    if ax is None:
+        ax = plt.gca()
+
+    # size of the axis in output pixels
+    fig = ax.get_figure()
+    bbox = ax.get_position()
+    pixelsX = bbox.width * fig.get_figwidth() * dpi
+    pixelsY = bbox.height * fig.get_figheight() * dpi
+    if vector:
+        pixelsX, pixelsY = pixelsX / vectorSpacing, pixelsY / vectorSpacing
+
+    factorX = max(int(varData.sizes['longitude'] // pixelsX), 1)
+    factorY = max(int(varData.sizes['latitude'] // pixelsY), 1)
+    if vector:
+        if factorX == 1 and factorY == 1:
+            return varData
+        return varData.isel(latitude=slice(None, None, factorY), longitude=slice(None, None, factorX))
+
+    if resolution is not None:
+        # the grid spacing is rounded so a 0.1 degree resolution is exactly 5 points of a 0.02 degree grid
+        latStep = abs(float(varData.latitude[1] - varData.latitude[0]))
+        lonStep = abs(float(varData.longitude[1] - varData.longitude[0]))
+        factorX = max(factorX, int(round(resolution / lonStep, 6)))
+        factorY = max(factorY, int(round(resolution / latStep, 6)))
+    if factorX == 1 and factorY == 1:
+        return varData
+
+    # grid boxes shrink toward the poles, so each one is weighted by its area (missing points aren't counted)
+    weights = np.cos(np.deg2rad(varData.latitude)).broadcast_like(varData).where(varData.notnull(), 0)
+    blocks = {'latitude': factorY, 'longitude': factorX}
+    displayData = (varData.fillna(0) * weights).coarsen(blocks, boundary='trim').sum() / weights.coarsen(blocks, boundary='trim').sum()
+    return displayData.astype(varData.dtype).rename(varData.name).assign_attrs(varData.attrs)
@@ -0,0 +1,219 @@
+"""
+Name: Profiling Functions
+Author: Nikhil Trivedi
+Description:
+This script contains the opt-in instrumentation for the other scripts in this "library", for finding out where the time goes in long runs like the
+steering sweeps (GRIB decoding, subsetting, radial binning, vortex detection, plotting, etc.). Profiling is off unless HAFS_PROFILE=1 is set or
+enable() is called (the profile parameter in the namelists does this), and when it's off the instrumented functions run with next to no overhead.
+When it's on, every stage records its wall time, CPU time, bytes read, and peak memory (the most memory in use during the stage above what was in
+use when it started, traced with tracemalloc, which numpy and xarray arrays report to), grouped by the model, member, and forecast hour it was run
+for, along with counters like files opened and cache hits. The process's overall peak memory is saved with the report. A JSON and CSV report and a
+summary table are written when the run ends. Only the process that profiling was enabled in is recorded, so the serial backends should be used
+when profiling. A list of these functions and a brief description of each of them will now be provided:
+1) enable: turns profiling on, choosing where the report is written at the end of the run
+2) stage: a context manager that records everything run within it as one call of a named stage
+3) profiled: a decorator that records every call of a function as a named stage
+4) labels: a context manager that tags the stages and counters run within it with a model, member, forecast hour, etc.
+5) count: adds to a named counter (files opened, cache hits, etc.) for the current labels
+6) writeReport: writes every stage and counter record to a JSON or CSV file
+7) printSummary: prints a table with the totals for each stage and counter
+Last modified July 31, 2024
+"""
+
+import os
+import csv
+import json
+import time
+import atexit
+import resource
+import tracemalloc
+import threading
+import functools
+import contextlib
+import contextvars
+
+enabled = os.environ.get("HAFS_PROFILE", "0") == "1"
+reportPath = os.environ.get("HAFS_PROFILE_REPORT", "./profile_report.json") # a CSV report is written next to it with the same name
+
+# the stage and counter totals, keyed by (name, labels)
+stageRecords, counterRecords = {}, {}
+recordsLock = threading.Lock()
+currentLabels = contextvars.ContextVar("currentLabels", default=())
+labelNames = ["model", "member", "hour"]
+
+# the highest traced memory seen so far while each running stage has been open, keyed by a token for each call
+activePeaks, peakLock = {}, threading.Lock()
+
+
+def getBytesRead():
+    # the number of bytes the whole process has read so far (Linux only, other systems report 0)
+    try:
+        with open("/proc/self/io") as file:
+            for line in file:
+                if line.startswith("rchar"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def getPeakMemory():
+    # the process's peak resident memory so far, in MB (ru_maxrss is in KB on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def updatePeaks():
+    # folds the traced memory peak since the last update into every stage that's running and starts a new peak, so nested stages (and stages
+    # on other threads) each get the peak of their own time span. Has to be called with peakLock held
+    _, peak = tracemalloc.get_traced_memory()
+    for token in activePeaks:
+        activePeaks[token] = max(activePeaks[token], peak)
+    tracemalloc.reset_peak()
+
+
+def enable(path=None):
+    # this function turns profiling on, with the report written to path (or the HAFS_PROFILE_REPORT default) and summarized when the run ends
+    global enabled, reportPath
+    if path is not None:
+        reportPath = path
+    atexit.unregister(finish)
+    atexit.register(finish)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    enabled = True
+
+
+@contextlib.contextmanager
+def stage(name):
+    # this context manager records the wall time, CPU time, bytes read, and peak memory of everything run within it as one call of the stage.
+    # Stages can be nested, in which case each of them includes the time and memory of the stages within it. The CPU time is only that of the
+    # thread the stage ran in, but the bytes read and memory are the whole process's, so they include anything done in the background at the
+    # same time. The peak memory is how far the traced memory rose above where it was when the stage started
+    if not enabled:
+        yield
+        return
+    token = object()
+    with peakLock:
+        updatePeaks()
+        memoryStart = tracemalloc.get_traced_memory()[0]
+        activePeaks[token] = memoryStart
+    wallStart, cpuStart, readStart = time.perf_counter(), time.thread_time(), getBytesRead()
+    try:
+        yield
+    finally:
+        wallTime, cpuTime, bytesRead = time.perf_counter() - wallStart, time.thread_time() - cpuStart, getBytesRead() - readStart
+        with peakLock:
+            updatePeaks()
+            peakMemory = (activePeaks.pop(token) - memoryStart) / 1024**2
+        key = (name, currentLabels.get())
+        with recordsLock:
+            record = stageRecords.setdefault(key, {"calls": 0, "wallSeconds": 0.0, "cpuSeconds": 0.0, "bytesRead": 0, "peakMemoryMB": 0.0})
+            record["calls"] += 1
+            record["wallSeconds"] += wallTime
+            record["cpuSeconds"] += cpuTime
+            record["bytesRead"] += bytesRead
+            record["peakMemoryMB"] = max(record["peakMemoryMB"], peakMemory)
+
+
+def profiled(name, labelArgs=()):
+    # this decorator records every call of the function as a call of the named stage. labelArgs names the labels that the function's first
+    # positional arguments give (e.g. ["model", "member", "hour"] for a function called as func(model, member, forecastHour))
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with labels(**dict(zip(labelArgs, args))), stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def labels(**newLabels):
+    # this context manager tags everything recorded within it with the given labels (e.g. model, member, and hour), on top of any outer labels
+    if not enabled:
+        yield
+        return
+    mergedLabels = dict(currentLabels.get())
+    mergedLabels.update({name: value for name, value in newLabels.items() if value is not None})
+    token = currentLabels.set(tuple(sorted(mergedLabels.items())))
+    try:
+        yield
+    finally:
+        currentLabels.reset(token)
+
+
+def count(name, amount=1):
+    # this function adds to a counter (files opened, cache hits, etc.) for the current labels
+    if not enabled:
+        return
+    key = (name, currentLabels.get())
+    with recordsLock:
+        counterRecords[key] = counterRecords.get(key, 0) + amount
+
+
+def getRows():
+    # flattens the stage and counter records into one row per (name, labels), with a column for each label
+    rows = []
+    for kind, records in [("stage", stageRecords), ("counter", counterRecords)]:
+        for (name, recordLabels), record in records.items():
+            row = {"kind": kind, "name": name}
+            row.update({labelName: "" for labelName in labelNames})
+            row.update(dict(recordLabels))
+            row.update(record if kind == "stage" else {"count": record})
+            rows.append(row)
+    return rows
+
+
+def writeReport(path=None):
+    # this function writes every record to a JSON file (or a CSV file if path ends in .csv)
+    path = reportPath if path is None else path
+    rows = getRows()
+    if path.endswith(".csv"):
+        columns = ["kind", "name"] + labelNames + ["calls", "wallSeconds", "cpuSeconds", "bytesRead", "peakMemoryMB", "count"]
+        columns += sorted({column for row in rows for column in row} - set(columns))
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, "w") as file:
+            json.dump({"processPeakMemoryMB": getPeakMemory(), "records": rows}, file, indent=2, default=str)
+    return path
+
+
+def printSummary():
+    # this function prints the totals of every stage (over all labels, sorted by wall time) and every counter
+    stageTotals = {}
+    for (name, _), record in stageRecords.items():
+        totals = stageTotals.setdefault(name, {"calls": 0, "wallSeconds": 0.0, "cpuSeconds": 0.0, "bytesRead": 0, "peakMemoryMB": 0.0})
+        for column in ["calls", "wallSeconds", "cpuSeconds", "bytesRead"]:
+            totals[column] += record[column]
+        totals["peakMemoryMB"] = max(totals["peakMemoryMB"], record["peakMemoryMB"])
+
+    print(f"\n{'stage':<22} {'calls':>7} {'wall s':>10} {'ms/call':>9} {'cpu s':>10} {'MB read':>10} {'peak MB':>9}")
+    for name, totals in sorted(stageTotals.items(), key=lambda item: -item[1]["wallSeconds"]):
+        print(f"{name:<22} {totals['calls']:>7} {totals['wallSeconds']:10.3f} {totals['wallSeconds'] / totals['calls'] * 1000:9.2f} "
+              f"{totals['cpuSeconds']:10.3f} {totals['bytesRead'] / 1e6:10.1f} {totals['peakMemoryMB']:9.1f}")
+
+    counterTotals = {}
+    for (name, _), value in counterRecords.items():
+        counterTotals[name] = counterTotals.get(name, 0) + value
+    if counterTotals:
+        print("\n" + ", ".join(f"{name}: {value}" for name, value in sorted(counterTotals.items())))
+
+
+def finish():
+    # writes the JSON and CSV reports and prints the summary, which happens automatically at the end of a profiled run
+    if not stageRecords and not counterRecords:
+        return
+    jsonPath = writeReport(os.path.splitext(reportPath)[0] + ".json")
+    csvPath = writeReport(os.path.splitext(reportPath)[0] + ".csv")
+    printSummary()
+    print(f"profiling report saved to {jsonPath} and {csvPath}")
+
+
+if enabled:
+    atexit.register(finish)
+    tracemalloc.start()
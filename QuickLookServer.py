@@ -0,0 +1,253 @@
+"""
+Name: Quick-Look Server
+Author: Nikhil Trivedi
+Description:
+This script runs a small HTTP server on the local machine that makes the HafsDataPlotter and HafsDiffPlotter maps on demand, so a map for any
+model, variable, level, and forecast hour can be pulled up in a browser without editing and rerunning a script. The regional fields and the
+rendered PNGs are both kept in least-recently-used caches, so a map that's been viewed before comes straight back from memory, and the most
+common maps are rendered ahead of time by a pool of background processes while the server starts taking requests. Nothing outside of this
+machine is used. Once it's running, open http://localhost:8050 to see what's cached, and ask for a map with e.g.
+http://localhost:8050/map.png?model=HFSB_default&variable=height&level=500&hour=24 (add &runType=mean for the ensemble mean, or
+&diff=HFSB_tiedtke for the difference from another model). Below is a namelist with parameters that can be modified to whatever is of interest.
+Descriptions of each of the parameters are commented to the right of them.
+Last modified July 31, 2024
+"""
+
+###################################################################################################################################
+# adjust these parameters based on your needs
+host = "127.0.0.1" # address to listen on (127.0.0.1 only accepts requests from this machine)
+port = 8050 # port to listen on
+dpi = 100 # resolution of the rendered maps (the saved plots use 300, which is much slower and more than a screen needs)
+mapCacheSize = 500 # number of rendered maps to keep in memory
+fieldCacheSize = 32 # number of loaded regional fields to keep in memory (each is a few MB)
+models = ["HFSA_default", "HFSB_default", "HFSB_progsigma", "HFSB_ras", "HFSB_tiedtke", "GFS_analysis"] # models that maps can be asked for
+meanMembers = range(0, 31) # ensemble members that the mean runType averages over
+decimate = True # coarsen the data to the figure's resolution before plotting (False plots the full grid)
+warmModels = ["HFSB_default", "HFSB_tiedtke"] # models whose maps are rendered ahead of time
+warmVariables = ["mslp", "height", "vector wind"] # variables whose maps are rendered ahead of time
+warmLevels = [500] # levels whose maps are rendered ahead of time (single-level variables only use the first)
+warmHours = [0, 24, 48, 72, 96, 120] # forecast hours whose maps are rendered ahead of time
+warmDiffModels = [["HFSB_default", "HFSB_tiedtke"]] # pairs of models whose difference maps are rendered ahead of time
+warmProcesses = 2 # number of background processes that render the warm-up maps (0 turns warming off)
+###################################################################################################################################
+
+import io
+import html
+import json
+import time
+import threading
+import itertools
+import functools
+import collections
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use("Agg")
+import HafsDataPlotter as dp
+import HafsDiffPlotter as dfp
+
+# variables that each kind of map knows how to plot
+mapVariables = dp.plotVariables
+diffVariables = ["mslp", "height", "zonal wind"]
+
+# matplotlib isn't thread safe, so only one map is drawn in the server process at a time
+renderLock = threading.Lock()
+
+
+class MapCache:
+    # this class holds the rendered PNGs, dropping the least recently viewed one once there are more than maxItems
+    def __init__(self, maxItems):
+        self.maxItems = maxItems
+        self.items = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+
+    def get(self, key, countMiss=True):
+        with self.lock:
+            if key not in self.items:
+                self.misses += countMiss
+                return None
+            self.hits += 1
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, png):
+        with self.lock:
+            self.items[key] = png
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxItems:
+                self.items.popitem(last=False)
+
+    def keys(self):
+        with self.lock:
+            return list(self.items)
+
+
+mapCache = MapCache(mapCacheSize)
+
+# maps that are being rendered right now (by a warm-up process or another request), so the same map is never drawn twice at once
+pending, pendingLock = {}, threading.Lock()
+
+
+@functools.lru_cache(maxsize=fieldCacheSize)
+def getField(model, variable, runType, forecastHour, level):
+    # returns the regional field(s) for a map, which are shared between that model's own map and any difference maps it's part of
+    members = range(0, 1) if runType == "control" else meanMembers
+    return dp.getPlotData(model, variable, members, forecastHour, level)
+
+
+def getMapKey(query):
+    # turns the query string of a request into the (model, variable, level, hour, runType, diff) key the map is cached under, raising a
+    # ValueError for anything that can't be plotted
+    params = {name: values[-1] for name, values in urllib.parse.parse_qs(query).items()}
+    model, variable = params.get("model"), params.get("variable")
+    runType, diffModel = params.get("runType", "control"), params.get("diff")
+    if model is None or variable is None or "hour" not in params:
+        raise ValueError("model, variable, and hour are required")
+    for name in [model, diffModel] if diffModel else [model]:
+        if name not in models:
+            raise ValueError(f"Unknown model: {name}")
+    if variable not in (diffVariables if diffModel else mapVariables):
+        raise ValueError(f"Unsupported variable for this map: {variable}")
+    if runType not in ["control", "mean"]:
+        raise ValueError(f"Unknown runType: {runType}")
+
+    # single-level variables are stored under the same level no matter which one was asked for
+    level = int(params.get("level", 500))
+    if variable in ["mslp", "refl"]:
+        level = -999
+    return model, variable, level, int(params["hour"]), runType, diffModel
+
+
+def renderMap(key):
+    # draws the map for a key and returns it as PNG bytes, reusing any fields that are still cached
+    model, variable, level, forecastHour, runType, diffModel = key
+    varData, zonalData, meridionalData = getField(model, variable, runType, forecastHour, level)
+    if diffModel:
+        fig = dfp.makeDiffPlot(varData, getField(diffModel, variable, runType, forecastHour, level)[0], [model, diffModel], variable, level,
+                               forecastHour, decimate)
+    else:
+        fig = dp.makePlot(varData, model, variable, level, forecastHour, zonalData, meridionalData, decimate)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def getMap(key):
+    # returns the PNG for a key and whether it came from the cache, waiting on the map if it's already being rendered somewhere else
+    png = mapCache.get(key)
+    if png is not None:
+        return png, True
+
+    with pendingLock:
+        future = pending.get(key)
+    if future is not None:
+        return future.result(), False
+
+    with renderLock:
+        # another request may have finished the same map while this one was waiting
+        png = mapCache.get(key, countMiss=False)
+        if png is None:
+            png = renderMap(key)
+            mapCache.put(key, png)
+    return png, False
+
+
+def getWarmKeys():
+    # returns the keys of the maps that are rendered ahead of time, with every model's maps before the difference maps
+    keys = []
+    for forecastHour, variable, level in itertools.product(warmHours, warmVariables, warmLevels):
+        if variable in ["mslp", "refl"]:
+            if level != warmLevels[0]:
+                continue
+            level = -999
+        keys += [(model, variable, level, forecastHour, "control", None) for model in warmModels]
+        if variable in diffVariables:
+            keys += [(diffPair[0], variable, level, forecastHour, "control", diffPair[1]) for diffPair in warmDiffModels]
+    return keys
+
+
+def startWarming(pool):
+    # hands the warm-up maps to the background processes, putting each one in the cache as soon as it's done
+    def finishWarming(key, future):
+        with pendingLock:
+            pending.pop(key, None)
+        if future.exception() is None:
+            mapCache.put(key, future.result())
+        else:
+            print(f"couldn't warm {key}: {future.exception()}")
+
+    for key in getWarmKeys():
+        with pendingLock:
+            pending[key] = pool.submit(renderMap, key)
+            pending[key].add_done_callback(functools.partial(finishWarming, key))
+
+
+class QuickLookHandler(BaseHTTPRequestHandler):
+    # this class answers the requests, serving maps from /map.png and a list of what's cached from /
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path == "/map.png":
+            try:
+                key = getMapKey(url.query)
+            except ValueError as error:
+                self.send_error(400, str(error))
+                return
+            start = time.perf_counter()
+            try:
+                png, cached = getMap(key)
+            except (FileNotFoundError, KeyError) as error:
+                self.send_error(404, f"No data for this map: {error}")
+                return
+            except Exception as error:
+                self.send_error(500, f"Couldn't render this map: {error}")
+                return
+            self.sendContent(png, "image/png", {"X-Cache": "hit" if cached else "miss",
+                                                "X-Render-Time": f"{time.perf_counter() - start:.3f}"})
+
+        elif url.path == "/status":
+            status = {"maps": len(mapCache.keys()), "hits": mapCache.hits, "misses": mapCache.misses, "warming": len(pending),
+                      "fields": getField.cache_info()._asdict()}
+            self.sendContent(json.dumps(status).encode(), "application/json")
+
+        elif url.path == "/":
+            links = []
+            for model, variable, level, forecastHour, runType, diffModel in mapCache.keys():
+                query = {"model": model, "variable": variable, "level": level, "hour": forecastHour, "runType": runType}
+                if diffModel:
+                    query["diff"] = diffModel
+                levelName = f" {level}mb" if level != -999 else ""
+                name = f"{model}{' - ' + diffModel if diffModel else ''} {variable}{levelName} hour {forecastHour} {runType}"
+                links.append(f'<li><a href="/map.png?{urllib.parse.urlencode(query)}">{html.escape(name)}</a></li>')
+            page = f"<html><body><h3>Cached maps ({len(links)}, {len(pending)} still warming)</h3><ul>{''.join(links)}</ul></body></html>"
+            self.sendContent(page.encode(), "text/html")
+
+        else:
+            self.send_error(404)
+
+    def sendContent(self, content, contentType, headers={}):
+        self.send_response(200)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer((host, port), QuickLookHandler)
+    pool = ProcessPoolExecutor(max_workers=warmProcesses) if warmProcesses else None
+    if pool is not None:
+        startWarming(pool)
+    print(f"serving maps at http://{'localhost' if host == '127.0.0.1' else host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -1,58 +1,166 @@
+import os
+import functools
 import numpy as np
 import pandas as pd
 import UsefulFunctions as uf
+import ParallelFunctions as paf
+import ProfilingFunctions as prof
+from LazyImports import LazyModule
 
 hours = np.array([0, 24, 48, 60, 72, 84, 96, 108, 120])
+storm, init = "ian", "2022092400" # storm and initialization of the data
+boxRadius = 2.5 # half-width (degrees) of the box around the TC center that the cross sections and steering profiles are taken from
+prefetchDepth = 4 # number of member/hour files to read ahead while the current one is processed (serial backend)
+prefetchBytes = 8 * 1024**3 # maximum memory that read-ahead files can take up (serial backend)
+backend = "serial" # serial, processes, dask-local, or dask-slurm (see runTasks in ParallelFunctions)
+workers = None # number of processes/dask workers to use (None uses every core for processes and dask-local)
+clusterKwargs = {} # extra settings for the dask cluster, e.g. {"queue": "...", "account": "...", "cores": 1, "memory": "16GB"} for Slurm
+retries = 2 # number of times a member/hour that fails is retried before the run stops (non-serial backends)
+profile = False # record where the time goes for every member and hour, saving a report and printing a summary at the end (serial backend)
+sweep = False # rather than the default vortex settings, evaluate every combination of sweepParams on cross sections that are only computed once
+sweepParams = {"searchDepth": [150, 200, 250], "strongThreshold": [0.4, 0.5, 0.6], "weakThreshold": [0.75], "thresholdPressure": [980, 990, 1000],
+               "minRadiusIdx": [2, 3, 4], "radiusFactor": [2]} # settings of getDynamicVortex to sweep over (any that are left out keep their defaults)
 
-for model in ["default", "tiedtke", "analysis"]:
-    members = range(0, 31)
-    if model == 'analysis':
-        members = range(0, 1)    
-
-    magnitudes, directions, depths = [], [], []
-    for member in members:
-        print(f"ARGHHHHHHHHHHHHHHHHHHHHHHH: {member}")
-        hourMags, hourDirs, hourDepths = [], [], []
-        for forecastHour in hours:
-            atcfData = uf.getAtcfData(model, [member], hours)[0]
-            atcfTimeStamp = atcfData.iloc[np.where(hours == forecastHour)[0][0]]
-            centerLat = atcfTimeStamp["latitude"]
-            centerLon = atcfTimeStamp["longitude"]
-
-            zonalData = uf.getMemberData(model, "zonal wind", [member], forecastHour)
-            meridionalData = uf.getMemberData(model, "meridional wind", [member], forecastHour)
-            if model == 'analysis':
-                centeredZonal = zonalData.sel(latitude=slice(centerLat+2.5, centerLat-2.5), longitude=slice(centerLon-2.5, centerLon+2.5))
-                centeredMeridional = meridionalData.sel(latitude=slice(centerLat+2.5, centerLat-2.5), longitude=slice(centerLon-2.5, centerLon+2.5)) 
-            else:
-                centeredZonal = zonalData.sel(latitude=slice(centerLat-2.5, centerLat+2.5), longitude=slice(centerLon-2.5, centerLon+2.5))
-                centeredMeridional = meridionalData.sel(latitude=slice(centerLat-2.5, centerLat+2.5), longitude=slice(centerLon-2.5, centerLon+2.5))
-            centeredData = np.sqrt(centeredZonal**2 + centeredMeridional**2)
-
-            radAvgData = uf.getRadAvgWinds(centeredData, atcfTimeStamp, model)
-            vortexBottom, vortexTop, vortexLeft, vortexRight = uf.getDynamicVortex(radAvgData, atcfTimeStamp)
-            hourDepths.append(vortexBottom - vortexTop)
-            
-            # calculate the average steering flow on the vortex
-            newLevels = radAvgData.level.sel(level=slice(vortexBottom, vortexTop)).values
-            weights = []
-            for newLevel in newLevels:
-                weights.append(newLevel / 1000)
-            zonalAvg = centeredZonal.sel(isobaricInhPa=newLevels).mean(dim=["latitude", "longitude"]).values
-            zonalAvg = np.average(zonalAvg, weights=weights) * 1.94384
-            meridionalAvg = centeredMeridional.sel(isobaricInhPa=newLevels).mean(dim=["latitude", "longitude"]).values
-            meridionalAvg = np.average(meridionalAvg, weights=weights) * 1.94384
-            magnitude = np.round(np.sqrt(zonalAvg**2 + meridionalAvg**2), 1)
-            direction = np.round((90 - np.rad2deg(np.arctan2(meridionalAvg, zonalAvg))) % 360, 1)
-            hourMags.append(magnitude)
-            hourDirs.append(direction)
-            
-        magnitudes.append(hourMags)
-        directions.append(hourDirs)
-        depths.append(hourDepths)
-    magnitudes = np.array(magnitudes)
-    directions = np.array(directions)
-    depths = np.array(depths)
-    np.savetxt(f'./SteerValues/{model}_steerSpeed.txt', magnitudes, fmt='%.1f')
-    np.savetxt(f'./SteerValues/{model}_steerDirection.txt', directions, fmt='%.1f')
-    np.savetxt(f'./SteerValues/{model}_vortexDepth.txt', depths, fmt='%d')
+xr = LazyModule("xarray")
+
+
+@functools.lru_cache(maxsize=None)
+def getMemberTrack(model, member, hours, storm, init):
+    # the ATCF track of one member, read once for every set of arguments (hours has to be a tuple so it can be part of the cache key)
+    return uf.getAtcfData(model, [member], np.array(hours), storm=storm, init=init)[0]
+
+
+@prof.profiled("loadWinds", labelArgs=["model", "member", "hour"])
+def loadWinds(model, member, forecastHour):
+    zonalData = uf.getMemberData(model, "zonal wind", [member], forecastHour, storm=storm, init=init)
+    meridionalData = uf.getMemberData(model, "meridional wind", [member], forecastHour, storm=storm, init=init)
+    return zonalData, meridionalData
+
+
+@prof.profiled("getCrossSection", labelArgs=["model", "member", "hour"])
+def getCrossSection(model, member, forecastHour, winds=None):
+    # calculates the radial-averaged wind cross section and the box-averaged zonal and meridional winds at every level for one member and
+    # forecast hour, which are all that the vortex detection and steering calculation need
+    atcfData = getMemberTrack(model, member, tuple(hours), storm, init)
+    atcfTimeStamp = atcfData.iloc[np.where(hours == forecastHour)[0][0]]
+    centerLat = atcfTimeStamp["latitude"]
+    centerLon = atcfTimeStamp["longitude"]
+
+    zonalData, meridionalData = winds if winds is not None else loadWinds(model, member, forecastHour)
+    centeredZonal = uf.getCenterBoxes(zonalData, centerLat, centerLon, boxRadius)
+    centeredMeridional = uf.getCenterBoxes(meridionalData, centerLat, centerLon, boxRadius)
+    centeredData = np.sqrt(centeredZonal**2 + centeredMeridional**2)
+
+    radAvgData = uf.getRadAvgWinds(centeredData, atcfTimeStamp, model)
+    zonalProfile = centeredZonal.mean(dim=["y", "x"])
+    meridionalProfile = centeredMeridional.mean(dim=["y", "x"])
+    return radAvgData, zonalProfile, meridionalProfile, atcfTimeStamp
+
+
+@prof.profiled("getSteering", labelArgs=["model", "member", "hour"])
+def getSteering(model, member, forecastHour, winds=None):
+    # calculates the vortex-averaged steering speed, direction, and vortex depth for one member and forecast hour
+    radAvgData, zonalProfile, meridionalProfile, atcfTimeStamp = getCrossSection(model, member, forecastHour, winds)
+    vortexBottom, vortexTop, vortexLeft, vortexRight = uf.getDynamicVortex(radAvgData, atcfTimeStamp)
+
+    # calculate the average steering flow on the vortex
+    newLevels = radAvgData.level.sel(level=slice(vortexBottom, vortexTop)).values
+    weights = []
+    for newLevel in newLevels:
+        weights.append(newLevel / 1000)
+    zonalAvg = zonalProfile.sel(isobaricInhPa=newLevels).values
+    zonalAvg = np.average(zonalAvg, weights=weights) * 1.94384
+    meridionalAvg = meridionalProfile.sel(isobaricInhPa=newLevels).values
+    meridionalAvg = np.average(meridionalAvg, weights=weights) * 1.94384
+    magnitude = np.round(np.sqrt(zonalAvg**2 + meridionalAvg**2), 1)
+    direction = np.round((90 - np.rad2deg(np.arctan2(meridionalAvg, zonalAvg))) % 360, 1)
+    return magnitude, direction, vortexBottom - vortexTop
+
+
+def getSourceTimes(model, members):
+    # returns the modification time of the track and every wind file that the cross sections are calculated from, in the order they're read
+    paths = [uf.getDataPath(model, member, product="track", storm=storm, init=init) for member in members]
+    paths += [uf.getDataPath(model, member, forecastHour, storm=storm, init=init) for member in members for forecastHour in hours]
+    return np.array([os.path.getmtime(path) for path in paths])
+
+
+def getCrossSections(model, members):
+    # returns the cross sections and wind profiles of every member and hour in one Dataset, which is saved the first time it's calculated so
+    # sweeps over the vortex settings never have to read the wind files again. The saved file is only reused if it was calculated for the
+    # same storm, initialization, members, hours, and binning, and none of its source files have changed since
+    path = f'./SteerValues/{model}_crossSections.nc'
+    settings = {"storm": storm, "init": init, "boxRadius": boxRadius, "radialBins": uf.radialBins, "sourceTimes": getSourceTimes(model, members)}
+    if os.path.exists(path):
+        with xr.open_dataset(path) as sections:
+            sections = sections.load()
+        if (list(sections.member.values) == list(members) and list(sections.hour.values) == list(hours)
+                and all(np.array_equal(np.atleast_1d(sections.attrs.get(name)), np.atleast_1d(value)) for name, value in settings.items())):
+            return sections
+
+    sectionItems = [(model, member, forecastHour) for member in members for forecastHour in hours]
+    crossSections, zonalProfiles, meridionalProfiles, minPressures = [], [], [], []
+    for (model, member, forecastHour), winds in paf.getPrefetched(sectionItems, loadWinds, depth=prefetchDepth, maxBytes=prefetchBytes):
+        radAvgData, zonalProfile, meridionalProfile, atcfTimeStamp = getCrossSection(model, member, forecastHour, winds)
+        crossSections.append(radAvgData.values)
+        zonalProfiles.append(zonalProfile.values)
+        meridionalProfiles.append(meridionalProfile.values)
+        minPressures.append(atcfTimeStamp["MSLP"])
+
+    shape = (len(members), len(hours))
+    sections = xr.Dataset({"crossSection": (["member", "hour", "level", "radial_distance"], np.reshape(crossSections, shape + radAvgData.shape)),
+                           "zonalWind": (["member", "hour", "level"], np.reshape(zonalProfiles, shape + zonalProfile.shape)),
+                           "meridionalWind": (["member", "hour", "level"], np.reshape(meridionalProfiles, shape + meridionalProfile.shape)),
+                           "minPressure": (["member", "hour"], np.reshape(minPressures, shape))},
+                          coords={"member": list(members), "hour": hours, "level": radAvgData.level.values,
+                                  "radial_distance": radAvgData.radial_distance.values}, attrs=settings)
+    sections.to_netcdf(path)
+    return sections
+
+
+def getSteeringSweep(sections, **vortexParams):
+    # calculates the vortex bounds, steering speed and direction, and vortex depth for every combination of the vortex settings and every member
+    # and hour at once, the same way getSteering does for the default settings
+    vortexData = uf.getVortexSweep(sections.crossSection, sections.minPressure, **vortexParams)
+    levels = sections.level
+    inVortex = (levels <= vortexData.vortexBottom) & (levels >= vortexData.vortexTop)
+    weights = (levels / 1000).where(inVortex, 0)
+    zonalAvg = (sections.zonalWind.where(inVortex, 0) * weights).sum("level", skipna=False) / weights.sum("level") * 1.94384
+    meridionalAvg = (sections.meridionalWind.where(inVortex, 0) * weights).sum("level", skipna=False) / weights.sum("level") * 1.94384
+    vortexData["steerSpeed"] = np.sqrt(zonalAvg**2 + meridionalAvg**2).round(1)
+    vortexData["steerDirection"] = ((90 - np.rad2deg(np.arctan2(meridionalAvg, zonalAvg))) % 360).round(1)
+    vortexData["vortexDepth"] = vortexData.vortexBottom - vortexData.vortexTop
+    return vortexData.transpose("param", ...)
+
+
+if __name__ == "__main__":
+    if profile:
+        prof.enable()
+    for model in ["default", "tiedtke", "analysis"]:
+        members = range(0, 31)
+        if model == 'analysis':
+            members = range(0, 1)
+
+        if sweep:
+            # every setting is evaluated on the same cross sections, giving a table of the vortex bounds and steering by setting, member, and hour
+            sweepData = getSteeringSweep(getCrossSections(model, members), **sweepParams)
+            sweepData.to_dataframe().to_csv(f'./SteerValues/{model}_vortexSweep.csv')
+            continue
+
+        steerItems = [(model, member, forecastHour) for member in members for forecastHour in hours]
+        if backend == "serial":
+            # the wind files are read in the background in the same order they're used
+            steerValues = []
+            for (model, member, forecastHour), winds in paf.getPrefetched(steerItems, loadWinds, depth=prefetchDepth, maxBytes=prefetchBytes):
+                steerValues.append(getSteering(model, member, forecastHour, winds))
+        else:
+            # each member's hours go to the same worker so its ATCF data is only read once
+            steerValues = paf.runTasks(getSteering, steerItems, backend, workers, retries, localityKey=lambda item: item[:2],
+                                       clusterKwargs=clusterKwargs)
+
+        steerValues = np.array(steerValues).reshape(len(members), len(hours), 3)
+        magnitudes = steerValues[:, :, 0]
+        directions = steerValues[:, :, 1]
+        depths = steerValues[:, :, 2]
+        np.savetxt(f'./SteerValues/{model}_steerSpeed.txt', magnitudes, fmt='%.1f')
+        np.savetxt(f'./SteerValues/{model}_steerDirection.txt', directions, fmt='%.1f')
+        np.savetxt(f'./SteerValues/{model}_vortexDepth.txt', depths, fmt='%d')
@@ -10,13 +10,32 @@ each of them will now be provided:
 3) getMemberData: returns an averaged xarray DataArray for the provided members, using the specified model, variable, and pressure level
 4) getRadAvgWinds: converts a cartesian coordinate system centered on a TC to a radial-averaged system, returning an xarray DataArray with this data
 5) getDynamicVortex: uses a radial-averaged DataArray to objectively estimate both the width and depth of a TC's vortex, returning its bounds
+6) getVortexSweep: runs getDynamicVortex for every combination of a grid of its settings on a whole stack of cross sections in one array operation
+7) getCenterBoxes: extracts storm-centered boxes for any number of TC centers at once using precomputed grid indices rather than repeated .sel calls
+8) getStormComposite: streams through the provided members once and returns the storm-centered mean and spread of a variable for every forecast hour
+9) getTrackDistances: computes the member x member great-circle track distance matrix over all forecast hours for one or several pooled schemes
+10) getTrackClusters: splits members into a given number of clusters using a track distance matrix (hierarchical or k-medoids clustering)
+11) getGreatCircle: returns the great-circle distance and initial bearing between any broadcastable arrays of lat/lon points
+12) getInterpolatedTracks: linearly interpolates every member's track to an arbitrary set of forecast hours (e.g. hourly) in one array operation
+13) getTrackMotion: derives storm speed and direction for every member and time from consecutive track positions
+14) getTrackProbabilities: rasterizes every member's interpolated track onto a grid, returning strike-probability and track-density maps by forecast window
+15) getDataPath: returns the GRIB or ATCF file for a storm, init, model, member, and forecast hour, looking it up in the file catalog if one's been built
+Only numpy, pandas, and the standard-library-only ProfilingFunctions and LazyImports are imported when this script is, and the slower packages
+are brought in through LazyModule, so the track, steering, and statistics functions can be used by compute-only tools and worker processes
+without waiting on the GRIB and plotting packages.
 Last modified July 31, 2024
 """
 
+import itertools
 import pandas as pd
-import xarray as xr
-import cfgrib
 import numpy as np
+import ProfilingFunctions as prof
+from LazyImports import LazyModule
+
+xr = LazyModule("xarray")
+cat = LazyModule("CatalogFunctions")
+hierarchy = LazyModule("scipy.cluster.hierarchy")
+spatialDistance = LazyModule("scipy.spatial.distance")
 
 # dictionaries for conversions
 varDict = {"mslp": "prmsl", "height": "gh", "shum": "q", "refl": "refc", "zonal wind": "u", "meridional wind": "v", "vert wind": "w", "temp": "t"}
@@ -35,16 +54,21 @@ typeDict = {"track": ["SW", "NE"], "intensity": ["Weak", "Strong"], "R34": ["R34
 datesDict = {0: "2022092400", 6: "2022092406", 12: "2022092412", 18: "2022092418", 24: "2022092500", 48: "2022092600", 60: "2022092612", 72: "2022092700", 
              84: "2022092712", 96: "2022092800", 108: "2022092812", 120: "2022092900"}
 
+# the type that loaded fields are decoded and stored as. The GRIB data only has float32 precision, so float64 would only double the memory
+# (member means and composites are still added up in float64 before being converted back)
+precision = "float32"
+
+# the edges (degrees from the TC center) of the radial bins that getRadAvgWinds averages the winds into
+radialBins = np.linspace(0, 2.5, 40)
+
 
-def getAtcfData(model, members, hours):
+@prof.profiled("getAtcfData")
+def getAtcfData(model, members, hours, storm="ian", init="2022092400"):
     # this function processes each ensemble's ATCF data into a list of DataFrames that's easy to work with
     frames  = []
     for member in members:
         # choose which data path to use
-        if model == "GFS_analysis":
-            atcfPath = f"/work2/noaa/aoml-hafs1/nikhil/bal092022.dat"
-        else:
-            atcfPath = f"/work2/noaa/aoml-hafs1/nikhil/ian_ensemble_tracks/{model}/2022092400/ian09l.2022092400.hfsb-h223-ens-cloud.{member:02}.trak.atcfunix"
+        atcfPath = getDataPath(model, member, product="track", storm=storm, init=init)
 
         # create dataframe from ATCF file
         data = pd.read_csv(atcfPath, sep=",", header=None)
@@ -94,45 +118,60 @@ def getClusterRanks(atcfData, hours, forecastHour, clusterType):
     return positions
 
 
-def getMemberData(model, variable, members, forecastHour, level=-999):
+@prof.profiled("getMemberData")
+def getMemberData(model, variable, members, forecastHour, level=-999, storm="ian", init="2022092400"):
     print(members)
     # this function returns a DataArray of the specificed variable averaged over the provided ensemble members
-    files = []
+    # the members are added up as they're read rather than stacked, so only one member's field (cut down to the level and domain) is held at once
+    total, count = None, None
+    # select the correct type of level (GFS analysis keeps reflectivity under a different one), copying keysDict so the change only lasts for
+    # this call rather than breaking every later read in a long-running process
+    filterKeys = keysDict
+    if model == "GFS_analysis" and variable == "refl":
+        filterKeys = {**keysDict, "refl": {'stepType': 'instant', 'typeOfLevel': 'atmosphere'}}
     for member in members:
-        # select the correct path and type of level
-        global keysDict
-        if model == "GFS_analysis":
-            path = f"/work2/noaa/aoml-hafs1/nikhil/IanGFSAnalysis/00l.2022092400.gfs.f{forecastHour:03}.GFS_analysis.grb2"
-            if variable == "refl":
-                keysDict = {"refl": {'stepType': 'instant', 'typeOfLevel': 'atmosphere'}, "height": {'typeOfLevel': 'isobaricInhPa'}}
+        # select the correct path
+        path = getDataPath(model, member, forecastHour, storm=storm, init=init)
+
+        with prof.labels(model=model, member=member, hour=forecastHour):
+            # open variable data, decoding it straight to the storage precision (NetCDF copies of the GRIB files, like the synthetic ones
+            # made by Benchmarks.py, already have every variable under its GRIB name)
+            with prof.stage("open"):
+                if path.endswith(".nc"):
+                    varDataset = xr.open_dataset(path)
+                else:
+                    varDataset = cat.openGribDataset(path, filterKeys[variable], precision)
+            prof.count("filesOpened")
+            varData = varDataset[varDict[variable]]
+
+            # select the level and lat/lon bounds before anything is read, then add the variable data to the running sum
+            with prof.stage("subset"):
+                if 'isobaricInhPa' in varData.dims and level != -999:
+                    varData = varData.sel(isobaricInhPa=level)
+                if model == "GFS_analysis":
+                    varData = varData.sel(latitude=slice(45, 10), longitude=slice(260, 310))
+                else:
+                    varData = varData.sel(latitude=slice(10, 45), longitude=slice(260, 310))
+            with prof.stage("decode"):
+                varData = varData.load()
+        if total is None:
+            total, count = varData.fillna(0).astype(np.float64), varData.notnull().astype(np.int32)
         else:
-            path = f"/work2/noaa/aoml-hafs1/ahazelto/student_data/ian_grb2_files/{model}/2022092400/00l.2022092400.hfsb.parent.atm.f{forecastHour:03}.{model}_{member:02}.grb2"
+            total += varData.fillna(0)
+            count += varData.notnull()
 
-        # open variable data
-        varDataset = xr.open_dataset(path, engine='cfgrib', filter_by_keys=keysDict[variable], backend_kwargs={'indexpath': f'{path}.idx'})
-        varData = varDataset[varDict[variable]]
-        if 'isobaricInhPa' in varData.dims and level != -999:
-            varData = varData.sel(isobaricInhPa=level)
-
-        # select the lat/lon bounds and append variable data to a list
-        if model == "GFS_analysis":
-            varData = varData.sel(latitude=slice(45, 10), longitude=slice(260, 310))
-        else:
-            varData = varData.sel(latitude=slice(10, 45), longitude=slice(260, 310))
-        files.append(varData)
-
-    # take the mean of the members and return the resulting DataArray
-    varData = xr.concat(files, dim='member').mean(dim='member')
+    # take the mean of the members (skipping missing values like .mean does) and return the resulting DataArray
+    varData = (total / count.where(count > 0)).astype(precision)
     return varData
 
 
+@prof.profiled("getRadAvgWinds")
 def getRadAvgWinds(centeredData, atcfTimeStamp, model):
     xCentered = centeredData['longitude'].values - atcfTimeStamp['longitude']
     yCentered = centeredData['latitude'].values - atcfTimeStamp['latitude']
     xCentered, yCentered = np.meshgrid(xCentered, yCentered)
 
     r = np.sqrt(xCentered**2 + yCentered**2)
-    radialBins = np.linspace(0, 2.5, 40)
 
     levels = centeredData.isobaricInhPa.values
     levelAverages = []
@@ -156,30 +195,35 @@ def getRadAvgWinds(centeredData, atcfTimeStamp, model):
     return crossSectionData
 
 
-def getDynamicVortex(crossSectionData, atcfTimeStamp):
+@prof.profiled("getDynamicVortex")
+def getDynamicVortex(crossSectionData, atcfTimeStamp, searchDepth=200, strongThreshold=0.5, weakThreshold=0.75, thresholdPressure=990,
+                     minRadiusIdx=3, radiusFactor=2):
     # dynamically calculate the height of the vortex
+    # searchDepth is how far above the bottom of the vortex (in hPa) the maximum winds are searched for, the vortex top is where the winds fall
+    # below strongThreshold (or weakThreshold for storms at or above thresholdPressure) times that maximum, and the vortex is radiusFactor times
+    # the radius of maximum winds wide, which is at least minRadiusIdx radial bins
     minPres = atcfTimeStamp['MSLP']
     for level in crossSectionData.level.values.astype(int):
         if level < minPres:
             break
     bottomLevel = level
 
-    maxIdx = crossSectionData.sel(level=slice(bottomLevel, bottomLevel - 200)).mean(dim="level").argmax().item()
-    if maxIdx < 3:
-        maxIdx = 3
-    vortexSlice = crossSectionData.isel(radial_distance=slice(0, maxIdx * 2))
+    maxIdx = crossSectionData.sel(level=slice(bottomLevel, bottomLevel - searchDepth)).mean(dim="level").argmax().item()
+    if maxIdx < minRadiusIdx:
+        maxIdx = minRadiusIdx
+    vortexSlice = crossSectionData.isel(radial_distance=slice(0, int(maxIdx * radiusFactor)))
     vortexMean = vortexSlice.mean(dim="radial_distance")
-    maxValue = vortexMean.sel(level=slice(bottomLevel, bottomLevel - 200)).max()
-    vortexMean = vortexMean.sel(level=slice(bottomLevel - 200, None))
+    maxValue = vortexMean.sel(level=slice(bottomLevel, bottomLevel - searchDepth)).max()
+    vortexMean = vortexMean.sel(level=slice(bottomLevel - searchDepth, None))
 
     dvDr = vortexSlice.differentiate("radial_distance")
     dvDrMean = dvDr.isel(radial_distance=slice(0, maxIdx)).mean("radial_distance")
 
     for level in vortexMean.level.values.astype(int):
-        if minPres < 990:
-            threshold = maxValue * 0.5
+        if minPres < thresholdPressure:
+            threshold = maxValue * strongThreshold
         else:
-            threshold = maxValue * 0.75
+            threshold = maxValue * weakThreshold
         if vortexMean.sel(level=level).item() <= threshold or dvDrMean.sel(level=level).item() < 0:
             break
 
@@ -187,3 +231,346 @@ def getDynamicVortex(crossSectionData, atcfTimeStamp):
     rightEdge = vortexSlice.radial_distance.values[-1]
     return bottomLevel, level, leftEdge, rightEdge
 
+
+@prof.profiled("getVortexSweep")
+def getVortexSweep(crossSections, minPressures, searchDepth=200, strongThreshold=0.5, weakThreshold=0.75, thresholdPressure=990,
+                   minRadiusIdx=3, radiusFactor=2):
+    # this function gives the same vortex bounds as getDynamicVortex, but for every combination of its settings and every cross section at once
+    # crossSections has the cross sections along its leading dimensions (e.g. member and hour) followed by level (running upward from the
+    # surface) and radial_distance, and minPressures has the matching MSLP values. Each setting can be one value or a list of them, and the
+    # bounds are returned in a Dataset with a 'param' dimension (one for each combination) in front of the cross sections' leading dimensions
+    settings = {"searchDepth": searchDepth, "strongThreshold": strongThreshold, "weakThreshold": weakThreshold,
+                "thresholdPressure": thresholdPressure, "minRadiusIdx": minRadiusIdx, "radiusFactor": radiusFactor}
+    grid = list(itertools.product(*[np.atleast_1d(values) for values in settings.values()]))
+    params = {name: np.array([combination[i] for combination in grid]) for i, name in enumerate(settings)}
+
+    # flatten the cross sections to (item, level, radius), with each parameter array shaped (param, 1) so it broadcasts against the items
+    itemDims = [dim for dim in crossSections.dims if dim not in ['level', 'radial_distance']]
+    sections = crossSections.transpose(*itemDims, 'level', 'radial_distance')
+    itemShape = sections.shape[:-2]
+    values = sections.values.reshape(-1, *sections.shape[-2:]).astype(np.float64)
+    minPres = np.asarray(minPressures.transpose(*itemDims).values, dtype=float).reshape(-1)
+    levels = sections.level.values.astype(int)
+    radialDistance = sections.radial_distance.values
+    depth, factor, minIdx = params["searchDepth"][:, np.newaxis], params["radiusFactor"][:, np.newaxis], params["minRadiusIdx"][:, np.newaxis]
+    radialIdx = np.arange(len(radialDistance))
+
+    # the NaNs (empty radial bins) are left out of every mean, like xarray's skipna, by summing the values and the valid counts separately
+    valid = (~np.isnan(values)).astype(np.float64)
+    filled = np.nan_to_num(values)
+    def maskedMean(mask, subscripts):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.einsum(subscripts, mask, filled) / np.einsum(subscripts, mask, valid)
+
+    # the bottom of the vortex is the first level above the minimum pressure (or the top level if there isn't one)
+    below = levels < minPres[:, np.newaxis]
+    bottomIdx = np.where(below.any(axis=1), below.argmax(axis=1), len(levels) - 1)
+    bottomLevel = levels[bottomIdx]
+    window = (levels <= bottomLevel[:, np.newaxis]) & (levels >= (bottomLevel - depth)[..., np.newaxis])
+
+    # radius of maximum winds within the search window, which sets the width of the vortex
+    windowMean = maskedMean(window, 'pnl,nlr->pnr')
+    maxIdx = np.where(np.isnan(windowMean), -np.inf, windowMean).argmax(axis=-1)
+    maxIdx = np.maximum(maxIdx, minIdx)
+    sliceLength = np.minimum((maxIdx * factor).astype(int), len(radialDistance))
+    vortexMean = maskedMean(radialIdx < sliceLength[..., np.newaxis], 'pnr,nlr->pnl')
+    windowValues = np.where(window & ~np.isnan(vortexMean), vortexMean, -np.inf).max(axis=-1)
+    maxValue = np.where(np.isfinite(windowValues), windowValues, np.nan)
+
+    # differentiating the vortex slice only differs from differentiating the whole cross section at the slice's last radius, where it's one-sided,
+    # and in np.gradient's formula, which also uses the center value (so NaNs spread further) when the spacing isn't exactly even. The bin
+    # centers aren't always exactly even in floating point, so both are calculated and each slice uses the one it would have
+    spacing = np.diff(radialDistance)
+    evenSpacing = np.array([(spacing[:length - 1] == spacing[0]).all() for length in range(1, len(radialDistance) + 1)])
+    with np.errstate(invalid='ignore'):
+        derivatives = [np.gradient(values, spacing[0], axis=-1), np.gradient(values, radialDistance, axis=-1),
+                       np.concatenate([np.full(values.shape[:-1] + (1,), np.nan), np.diff(values, axis=-1) / spacing], axis=-1)]
+    derivMask = radialIdx < np.minimum(maxIdx, sliceLength)[..., np.newaxis]
+    edgeMask = derivMask & (radialIdx == (sliceLength - 1)[..., np.newaxis]) & (sliceLength > 1)[..., np.newaxis]
+    evenMask = evenSpacing[sliceLength - 1][..., np.newaxis]
+    derivSum, derivCount = 0, 0
+    for mask, derivative in zip([derivMask & ~edgeMask & evenMask, derivMask & ~edgeMask & ~evenMask, edgeMask], derivatives):
+        derivSum = derivSum + np.einsum('pnr,nlr->pnl', mask, np.nan_to_num(derivative))
+        derivCount = derivCount + np.einsum('pnr,nlr->pnl', mask, (~np.isnan(derivative)).astype(np.float64))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dvDrMean = derivSum / derivCount
+
+    # the top of the vortex is the first level above the search window where the winds weaken enough or start increasing outward
+    threshold = maxValue * np.where(minPres < params["thresholdPressure"][:, np.newaxis], params["strongThreshold"][:, np.newaxis],
+                                    params["weakThreshold"][:, np.newaxis])
+    above = levels <= (bottomLevel - depth)[..., np.newaxis]
+    with np.errstate(invalid='ignore'):
+        stop = above & ((vortexMean <= threshold[..., np.newaxis]) | (dvDrMean < 0))
+    lastAbove = len(levels) - 1 - above[..., ::-1].argmax(axis=-1)
+    topIdx = np.where(stop.any(axis=-1), stop.argmax(axis=-1), np.where(above.any(axis=-1), lastAbove, bottomIdx))
+
+    # package the bounds with the parameters of each combination as coordinates
+    dims = ['param'] + itemDims
+    shape = (len(grid),) + itemShape
+    coords = {dim: sections[dim].values for dim in itemDims if dim in sections.coords}
+    coords.update({name: ('param', values) for name, values in params.items()})
+    vortexData = xr.Dataset({"vortexBottom": (dims, np.broadcast_to(bottomLevel, topIdx.shape).reshape(shape)),
+                             "vortexTop": (dims, levels[topIdx].reshape(shape)),
+                             "vortexLeft": (dims, np.full(shape, radialDistance[0])),
+                             "vortexRight": (dims, radialDistance[sliceLength - 1].reshape(shape))},
+                            coords=coords)
+    return vortexData
+
+
+@prof.profiled("getCenterBoxes")
+def getCenterBoxes(varData, centerLats, centerLons, boxRadius=2.5):
+    # this function gathers a box of +/- boxRadius degrees around each provided TC center in one indexing step
+    # centerLats/centerLons can be a single center, a (member) array, or a (member, hour) array, and varData can either be one field shared by
+    # every center or have matching 'member'/'hour' dimensions. The boxes always run south to north, so GFS data needs no reversed slices
+    centerLats, centerLons = np.asarray(centerLats, dtype=float), np.asarray(centerLons, dtype=float)
+    centerDims = ['member', 'hour'][:centerLats.ndim]
+
+    # the grid is regular, so each center can be converted to an integer grid offset with simple arithmetic
+    lats, lons = varData['latitude'].values, varData['longitude'].values
+    latStep, lonStep = lats[1] - lats[0], lons[1] - lons[0]
+    latRadius = int(round(boxRadius / abs(latStep)))
+    lonRadius = int(round(boxRadius / abs(lonStep)))
+    latOffsets = np.arange(-latRadius, latRadius + 1) * int(np.sign(latStep))
+    lonOffsets = np.arange(-lonRadius, lonRadius + 1) * int(np.sign(lonStep))
+    latIdx = np.rint((centerLats - lats[0]) / latStep).astype(int)[..., np.newaxis] + latOffsets
+    lonIdx = np.rint((centerLons - lons[0]) / lonStep).astype(int)[..., np.newaxis] + lonOffsets
+
+    # points that fall outside of the domain are filled with NaNs rather than wrapping around
+    latValid = (latIdx >= 0) & (latIdx < len(lats))
+    lonValid = (lonIdx >= 0) & (lonIdx < len(lons))
+    latIdx, lonIdx = np.clip(latIdx, 0, len(lats) - 1), np.clip(lonIdx, 0, len(lons) - 1)
+
+    # move the center dimensions to the front and the lat/lon dimensions to the back before gathering
+    sharedDims = [dim for dim in centerDims if dim in varData.dims]
+    otherDims = [dim for dim in varData.dims if dim not in sharedDims + ['latitude', 'longitude']]
+    values = varData.transpose(*sharedDims, 'latitude', 'longitude', *otherDims).values
+    indexer = []
+    for i, dim in enumerate(centerDims):
+        if dim in sharedDims:
+            shape = [1] * (len(centerDims) + 2)
+            shape[i] = centerLats.shape[i]
+            indexer.append(np.arange(centerLats.shape[i]).reshape(shape))
+    indexer += [latIdx[..., :, np.newaxis], lonIdx[..., np.newaxis, :]]
+    boxes = values[tuple(indexer)]
+    boxes = np.where((latValid[..., :, np.newaxis] & lonValid[..., np.newaxis, :]).reshape(boxes.shape[:len(centerDims) + 2] + (1,) * len(otherDims)),
+                     boxes, np.nan)
+    boxes = np.moveaxis(boxes, [len(centerDims), len(centerDims) + 1], [-2, -1])
+
+    # keep the real latitude/longitude of every box so it can still be used like the .sel output
+    coords = {dim: varData[dim].values for dim in otherDims if dim in varData.coords}
+    coords['y'] = np.arange(-latRadius, latRadius + 1) * abs(latStep)
+    coords['x'] = np.arange(-lonRadius, lonRadius + 1) * abs(lonStep)
+    coords['latitude'] = (centerDims + ['y'], lats[latIdx])
+    coords['longitude'] = (centerDims + ['x'], lons[lonIdx])
+    boxData = xr.DataArray(boxes, dims=centerDims + otherDims + ['y', 'x'], coords=coords, name=varData.name, attrs=varData.attrs)
+    return boxData
+
+
+@prof.profiled("getStormComposite")
+def getStormComposite(model, variable, members, hours, level=-999, boxRadius=10, storm="ian", init="2022092400"):
+    # this function composites a variable in storm-relative coordinates over the provided members (e.g. a cluster from getClusterRanks)
+    # each member/hour is read once and folded into running mean/variance sums (Welford's method), so only one field is held at a time
+    # box points that fall outside of the domain for some members are averaged over the members that do have them
+    if len(members) == 0:
+        raise ValueError("getStormComposite needs at least one member")
+    hours = np.array(hours)
+    atcfData = getAtcfData(model, members, hours, storm=storm, init=init)
+
+    count, runningMean, runningM2 = None, None, None
+    for member, memberData in zip(members, atcfData):
+        # shift every hour to storm-relative coordinates, keeping only the small centered box from each field
+        boxes = []
+        for i, forecastHour in enumerate(hours):
+            varData = getMemberData(model, variable, [member], forecastHour, level, storm=storm, init=init)
+            boxes.append(getCenterBoxes(varData, memberData['latitude'].iloc[i], memberData['longitude'].iloc[i], boxRadius))
+        memberBoxes = xr.concat(boxes, dim='hour')
+        values = memberBoxes.values.astype(np.float64)
+
+        # update the running sums for all forecast hours at once, only where this member has data
+        if runningMean is None:
+            count, runningMean, runningM2 = np.zeros_like(values), np.zeros_like(values), np.zeros_like(values)
+        valid = ~np.isnan(values)
+        count += valid
+        delta = np.where(valid, values - runningMean, 0)
+        runningMean += delta / np.maximum(count, 1)
+        runningM2 += np.where(valid, delta * (values - runningMean), 0)
+
+    # package the mean and spread (standard deviation between members) into a Dataset on the storm-centered grid
+    dims = memberBoxes.dims
+    coords = {dim: memberBoxes[dim].values for dim in dims if dim in memberBoxes.coords}
+    coords['hour'] = hours
+    runningMean = np.where(count > 0, runningMean, np.nan)
+    spread = np.where(count > 0, np.sqrt(runningM2 / np.maximum(count - 1, 1)), np.nan)
+    compositeData = xr.Dataset({'mean': (dims, runningMean.astype(precision)), 'spread': (dims, spread.astype(precision))}, coords=coords,
+                               attrs={'model': model, 'variable': variable, 'members': len(members), 'storm': storm, 'init': init})
+    return compositeData
+
+
+def getTrackDistances(*schemeData):
+    # this function returns the mean great-circle distance (km) between every pair of member tracks over all forecast hours
+    # any number of getAtcfData lists (schemes, initializations) can be passed, and their members are pooled in the order given
+    frames = [memberData for atcfData in schemeData for memberData in atcfData]
+    lats = np.array([memberData['latitude'].values for memberData in frames], dtype=float)
+    lons = np.array([memberData['longitude'].values for memberData in frames], dtype=float)
+
+    # great-circle distances broadcast over (member, member, hour)
+    distances, _ = getGreatCircle(lats[:, np.newaxis, :], lons[:, np.newaxis, :], lats[np.newaxis, :, :], lons[np.newaxis, :, :])
+    return np.nanmean(distances, axis=2)
+
+
+def getTrackClusters(trackDistances, numClusters, method="hierarchical", maxIterations=100):
+    # this function assigns each member a cluster label (0 to numClusters - 1) from a getTrackDistances matrix
+    if method == "hierarchical":
+        # average-linkage clustering on the condensed distance matrix
+        links = hierarchy.linkage(spatialDistance.squareform(trackDistances, checks=False), method='average')
+        return hierarchy.fcluster(links, numClusters, criterion='maxclust') - 1
+
+    elif method == "kmedoids":
+        # k-means style partitioning that works directly on the distance matrix, seeded with the most central member and then the
+        # members farthest from the existing medoids so results are deterministic
+        medoids = [np.argmin(trackDistances.sum(axis=1))]
+        while len(medoids) < numClusters:
+            # members that are already medoids are skipped, since identical tracks would otherwise tie at a distance of 0
+            farthest = trackDistances[:, medoids].min(axis=1).astype(float)
+            farthest[medoids] = -np.inf
+            medoids.append(np.argmax(farthest))
+        medoids = np.array(medoids)
+
+        for _ in range(maxIterations):
+            labels = np.argmin(trackDistances[:, medoids], axis=1)
+            # the new medoid of each cluster is the member with the smallest total distance to the rest of that cluster
+            costs = trackDistances @ (labels[:, np.newaxis] == np.arange(numClusters)).astype(float)
+            costs[labels[:, np.newaxis] != np.arange(numClusters)] = np.inf
+            # a cluster that's lost all of its members keeps its old medoid rather than moving to member 0
+            empty = np.isinf(costs).all(axis=0)
+            newMedoids = np.where(empty, medoids, np.argmin(costs, axis=0))
+            if np.array_equal(newMedoids, medoids):
+                break
+            medoids = newMedoids
+        return np.argmin(trackDistances[:, medoids], axis=1)
+
+    raise ValueError(f"Unknown clustering method: {method}")
+
+
+def getGreatCircle(lat1, lon1, lat2, lon2):
+    # this function returns the great-circle distance (km) and initial bearing (degrees clockwise from north) from point 1 to point 2
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    dLat, dLon = lat2 - lat1, lon2 - lon1
+
+    # haversine formula for the distance and the forward azimuth for the bearing
+    a = np.sin(dLat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dLon / 2)**2
+    distance = 2 * 6371 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    bearing = np.degrees(np.arctan2(np.sin(dLon) * np.cos(lat2), np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dLon))) % 360
+    return distance, bearing
+
+
+def getInterpolatedTracks(atcfData, hours, newHours):
+    # this function interpolates every member's track from the ATCF hours to newHours, returning (member, time) latitude/longitude arrays
+    # positions before the first or after the last ATCF hour are held at the end points
+    hours, newHours = np.asarray(hours, dtype=float), np.asarray(newHours, dtype=float)
+    lats = np.array([memberData['latitude'].values for memberData in atcfData], dtype=float)
+    lons = np.array([memberData['longitude'].values for memberData in atcfData], dtype=float)
+
+    # the bracketing hours are found with a binary search, so the ATCF hours are put in order first
+    hourOrder = np.argsort(hours, kind='stable')
+    hours, lats, lons = hours[hourOrder], lats[:, hourOrder], lons[:, hourOrder]
+    if len(hours) == 1:
+        # there's nothing to interpolate between, so the one position is held for every new hour
+        return np.repeat(lats, len(newHours), axis=1), np.repeat(lons, len(newHours), axis=1)
+
+    # find the bracketing ATCF hours and weights once, then apply them to all members together
+    idx = np.clip(np.searchsorted(hours, newHours, side='right') - 1, 0, len(hours) - 2)
+    weights = np.clip((newHours - hours[idx]) / (hours[idx + 1] - hours[idx]), 0, 1)
+    newLats = lats[:, idx] * (1 - weights) + lats[:, idx + 1] * weights
+    newLons = lons[:, idx] * (1 - weights) + lons[:, idx + 1] * weights
+    return newLats, newLons
+
+
+def getTrackMotion(lats, lons, hours):
+    # this function returns storm speed (kts) and direction of motion (deg) for (member, time) track arrays, e.g. from getInterpolatedTracks
+    # motion uses the positions before and after each time (one-sided at the ends), matching the ATCF speed/direction conventions
+    lats, lons, hours = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float), np.asarray(hours, dtype=float)
+    prevIdx = np.maximum(np.arange(len(hours)) - 1, 0)
+    nextIdx = np.minimum(np.arange(len(hours)) + 1, len(hours) - 1)
+
+    distance, direction = getGreatCircle(lats[..., prevIdx], lons[..., prevIdx], lats[..., nextIdx], lons[..., nextIdx])
+    speed = distance / (hours[nextIdx] - hours[prevIdx]) / 1.852
+    return speed, direction
+
+
+@prof.profiled("getTrackProbabilities")
+def getTrackProbabilities(atcfData, hours, gridLats, gridLons, radius=120, windows=None, stepHours=1):
+    # this function rasterizes the members' tracks onto a regular lat/lon grid, returning for each (start, end) forecast window the strike
+    # probability (fraction of members whose center passes within radius km of a grid point) and track density (hours per member that the
+    # center spends within radius km). The tracks are interpolated to every stepHours so fast storms don't skip over grid points, and distances
+    # are only calculated for the box of grid points around each position, one member at a time so the memory stays small. Windows include
+    # their start hour but not their end hour (unless it's the last forecast hour), so a position at the hour that's shared by two adjacent
+    # windows is only counted in the later one
+    hours = np.asarray(hours, dtype=float)
+    gridLats, gridLons = np.asarray(gridLats, dtype=float), np.asarray(gridLons, dtype=float)
+    windows = [(hours[0], hours[-1])] if windows is None else windows
+    newHours = np.arange(hours[0], hours[-1] + stepHours / 2, stepHours)
+    lats, lons = getInterpolatedTracks(atcfData, hours, newHours)
+
+    # the box is sized for the most poleward position (where a degree of longitude is shortest), with an extra point for the rounding to the
+    # nearest grid point
+    latStep, lonStep = gridLats[1] - gridLats[0], gridLons[1] - gridLons[0]
+    kmPerDegree = 6371 * np.pi / 180
+    latRadius = int(np.ceil(radius / kmPerDegree / abs(latStep))) + 1
+    lonRadius = int(np.ceil(radius / (kmPerDegree * np.cos(np.radians(min(np.abs(lats).max(), 89)))) / abs(lonStep))) + 1
+    latOffsets = np.arange(-latRadius, latRadius + 1)[:, np.newaxis]
+    lonOffsets = np.arange(-lonRadius, lonRadius + 1)[np.newaxis, :]
+    lastHour = newHours[-1]
+    windowMasks = np.array([(newHours >= start) & ((newHours < end) | ((newHours == end) & (end >= lastHour))) for start, end in windows])
+
+    gridSize = len(gridLats) * len(gridLons)
+    strikes = np.zeros((len(windows), gridSize))
+    density = np.zeros((len(windows), gridSize))
+    for memberLats, memberLons in zip(lats, lons):
+        # (time, y, x) grid indices around every position, where points outside of the domain are dropped rather than wrapped
+        latIdx = np.rint((memberLats - gridLats[0]) / latStep).astype(int)[:, np.newaxis, np.newaxis] + latOffsets
+        lonIdx = np.rint((memberLons - gridLons[0]) / lonStep).astype(int)[:, np.newaxis, np.newaxis] + lonOffsets
+        valid = (latIdx >= 0) & (latIdx < len(gridLats)) & (lonIdx >= 0) & (lonIdx < len(gridLons))
+        latIdx, lonIdx = np.clip(latIdx, 0, len(gridLats) - 1), np.clip(lonIdx, 0, len(gridLons) - 1)
+        distance, _ = getGreatCircle(memberLats[:, np.newaxis, np.newaxis], memberLons[:, np.newaxis, np.newaxis], gridLats[latIdx], gridLons[lonIdx])
+        within = valid & (distance <= radius)
+        flatIdx = latIdx * len(gridLons) + lonIdx
+
+        # every position within the radius adds to the density, but each member only counts once towards the strike probability
+        for i, windowMask in enumerate(windowMasks):
+            memberCounts = np.bincount(flatIdx[within & windowMask[:, np.newaxis, np.newaxis]], minlength=gridSize)
+            density[i] += memberCounts
+            strikes[i] += memberCounts > 0
+
+    dims = ['window', 'latitude', 'longitude']
+    shape = (len(windows), len(gridLats), len(gridLons))
+    coords = {'window': [f"{start:g}-{end:g}" for start, end in windows], 'windowStart': ('window', [start for start, _ in windows]),
+              'windowEnd': ('window', [end for _, end in windows]), 'latitude': gridLats, 'longitude': gridLons}
+    probabilityData = xr.Dataset({'strikeProbability': (dims, (strikes / len(lats)).reshape(shape).astype(precision)),
+                                  'trackDensity': (dims, (density * stepHours / len(lats)).reshape(shape).astype(precision))},
+                                 coords=coords, attrs={'radius': radius, 'stepHours': stepHours, 'members': len(lats)})
+    return probabilityData
+
+
+def getDataPath(model, member, forecastHour=-1, product="parent.atm", storm="ian", init="2022092400"):
+    # this function returns the path of a GRIB file (or, with product="track", an ATCF file, which holds every forecast hour). The file
+    # catalog is checked first, and if nothing has been cataloged the path is built the way the Ian data on /work2 is laid out
+    if product == "track":
+        forecastHour = -1
+        if model == "GFS_analysis":
+            # the analysis uses the best track, which covers every initialization
+            model, member, init = "best", 0, ""
+    elif model == "GFS_analysis":
+        member = 0
+    path = cat.getCatalogPath(storm, init, model, member, forecastHour, product)
+    prof.count("catalogHits" if path is not None else "catalogMisses")
+    if path is not None:
+        return path
+
+    if product == "track":
+        if model == "best":
+            return f"/work2/noaa/aoml-hafs1/nikhil/bal092022.dat"
+        return f"/work2/noaa/aoml-hafs1/nikhil/{storm}_ensemble_tracks/{model}/{init}/{storm}09l.{init}.hfsb-h223-ens-cloud.{member:02}.trak.atcfunix"
+    if model == "GFS_analysis":
+        return f"/work2/noaa/aoml-hafs1/nikhil/IanGFSAnalysis/00l.{init}.gfs.f{forecastHour:03}.GFS_analysis.grb2"
+    return f"/work2/noaa/aoml-hafs1/ahazelto/student_data/{storm}_grb2_files/{model}/{init}/00l.{init}.hfsb.{product}.f{forecastHour:03}.{model}_{member:02}.grb2"
@@ -15,18 +15,18 @@ forecastHour = 24 # forecast hour to use
 hours = [0, 6, 12, 18, 24, 48, 60, 72, 84, 96, 108, 120] # hours to pull from ATCF file
 model = "HFSB_default" # HFSA_default  HFSB_default  HFSB_progsigma  HFSB_ras  HFSB_tiedtke  GFS_analysis
 member = 0 # ensemble member to calculate steering for (0 indicates the control)
+decimate = True # coarsen the map data to the figure's resolution before plotting (False plots the full grid)
 ###################################################################################################################################
 
-import xarray as xr
 import numpy as np
 import pandas as pd
 from scipy import interpolate
 import cartopy.crs as ccrs
-import cartopy.feature as cf
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 import matplotlib.patheffects as PathEffects
 import UsefulFunctions as uf
+import PlottingFunctions as pf
 
 hours = np.array(hours)
 atcfData = uf.getAtcfData(model, [member], hours)[0]
@@ -36,8 +36,8 @@ centerLon = atcfTimeStamp["longitude"]
 
 zonalData = uf.getMemberData(model, "zonal wind", [member], forecastHour)
 meridionalData = uf.getMemberData(model, "meridional wind", [member], forecastHour)
-centeredZonal = zonalData.sel(latitude=slice(centerLat-2.5, centerLat+2.5), longitude=slice(centerLon-2.5, centerLon+2.5))
-centeredMeridional = meridionalData.sel(latitude=slice(centerLat-2.5, centerLat+2.5), longitude=slice(centerLon-2.5, centerLon+2.5))
+centeredZonal = uf.getCenterBoxes(zonalData, centerLat, centerLon)
+centeredMeridional = uf.getCenterBoxes(meridionalData, centerLat, centerLon)
 centeredData = np.sqrt(centeredZonal**2 + centeredMeridional**2)
 
 radAvgData = uf.getRadAvgWinds(centeredData, atcfTimeStamp, model)
@@ -81,31 +81,21 @@ print(newLevels)
 weights = []
 for newLevel in newLevels:
     weights.append(newLevel / 1000)
-zonalAvg = centeredZonal.sel(isobaricInhPa=newLevels).mean(dim=["latitude", "longitude"]).values
+zonalAvg = centeredZonal.sel(isobaricInhPa=newLevels).mean(dim=["y", "x"]).values
 zonalAvg = np.average(zonalAvg, weights=weights) * 1.94384
-meridionalAvg = centeredMeridional.sel(isobaricInhPa=newLevels).mean(dim=["latitude", "longitude"]).values
+meridionalAvg = centeredMeridional.sel(isobaricInhPa=newLevels).mean(dim=["y", "x"]).values
 meridionalAvg = np.average(meridionalAvg, weights=weights) * 1.94384
 magnitude = np.round(np.sqrt(zonalAvg**2 + meridionalAvg**2), 1)
 direction = np.round((90 - np.rad2deg(np.arctan2(meridionalAvg, zonalAvg))) % 360, 1)
 
 # plot cartopy map and various features
-plt.figure(figsize=(10, 6))
-ax = plt.axes(projection=ccrs.PlateCarree(central_longitude=180))
-ax.add_feature(cf.LAND)
-ax.add_feature(cf.STATES, linewidth=0.2, edgecolor="gray")
-ax.add_feature(cf.BORDERS, linewidth=0.3)
-ax.coastlines(linewidth=0.5, resolution='50m')
+fig, ax = pf.getBaseFigure(figsize=(10, 6))
 ax.plot([centerLon-2.5, centerLon+2.5, centerLon+2.5, centerLon-2.5, centerLon-2.5], [centerLat-2.5, centerLat-2.5, centerLat+2.5, centerLat+2.5, centerLat-2.5], 
         transform=ccrs.PlateCarree(), color='black')
 
-# plot gridlines
-gl = ax.gridlines(crs=ccrs.PlateCarree(), draw_labels=True, linewidth=1, color='gray', alpha=0.5, linestyle='--')
-gl.top_labels = gl.right_labels = False
-gl.xlabel_style = {'size': 7, 'weight': 'bold', 'color': 'gray'}
-gl.ylabel_style = {'size': 7, 'weight': 'bold', 'color': 'gray'}
-
 hgtData = uf.getMemberData(model, "height", [member], forecastHour, 500)
 hgtData = hgtData / 10
+hgtData = pf.getDisplayData(hgtData, ax, enabled=decimate)
 levelsContour = np.arange(586, 592, 2)
 levelsContourf = np.arange(492, 600, 1)
 newcmp = LinearSegmentedColormap.from_list("", [
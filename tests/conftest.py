@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the scripts in this library import each other by name, so the tests run them from the repository directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,77 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+
+pytest.importorskip("cfgrib")
+pytest.importorskip("eccodes")
+import xarray as xr
+import CatalogFunctions as cat
+import Benchmarks as bench
+
+filterSets = [{'typeOfLevel': 'isobaricInhPa'}, {'typeOfLevel': 'meanSea'}]
+
+
+@pytest.fixture
+def gribPath(tmp_path, monkeypatch):
+    # a small synthetic GRIB2 file laid out like the HAFS parent files, with its index kept in a temporary index directory
+    monkeypatch.setattr(cat, "indexDir", str(tmp_path / "GribIndexes"))
+    cat.loadFileIndex.cache_clear()
+    lats, lons, levels = np.arange(10, 20.01, 0.5), np.arange(270, 285.01, 0.5), [850, 500, 200]
+    fields = bench.getFixtureFields(lats, lons, levels, 15, 278, 100, 960, -5, 2)
+    path = str(tmp_path / "00l.2022092400.hfsb.parent.atm.f024.HFSB_test_00.grb2")
+    bench.writeGribFile(path, lats, lons, levels, 24, fields)
+    return path
+
+
+def checkMatchesCfgrib(path, filterByKeys):
+    # openGribDataset has to give the same Dataset as opening the file with cfgrib directly
+    dataset = cat.openGribDataset(path, filterByKeys)
+    expected = xr.open_dataset(path, engine="cfgrib", filter_by_keys=filterByKeys, indexpath="")
+    assert sorted(dataset.data_vars) == sorted(expected.data_vars)
+    for name in expected.data_vars:
+        assert dataset[name].dims == expected[name].dims
+        assert dataset[name].dtype == np.float32
+        np.testing.assert_allclose(dataset[name].values, expected[name].values, rtol=1e-6)
+    for name in expected.coords:
+        np.testing.assert_array_equal(dataset[name].values, expected[name].values)
+
+
+@pytest.mark.parametrize("filterByKeys", filterSets)
+def test_openGribDataset(gribPath, filterByKeys):
+    if not cat.isCfgribSupported():
+        pytest.skip(f"cfgrib isn't version {cat.cfgribVersion}, so the shared index store isn't used")
+    checkMatchesCfgrib(gribPath, filterByKeys)
+
+    # the index is built once in the index directory and shared by every filter set
+    assert cat.loadFileIndex.cache_info().currsize == 1
+    assert cat.getIndexPath(gribPath).startswith(cat.indexDir)
+
+
+@pytest.mark.parametrize("filterByKeys", filterSets)
+def test_openGribDatasetFallback(gribPath, filterByKeys, monkeypatch):
+    # other cfgrib versions are opened through cfgrib's own open_dataset
+    monkeypatch.setattr(cat, "isCfgribSupported", lambda: False)
+    checkMatchesCfgrib(gribPath, filterByKeys)
+
+
+def test_getFileIndexThreads(gribPath, monkeypatch):
+    # prefetch threads that ask for the same file's index at the same time only build it once
+    if not cat.isCfgribSupported():
+        pytest.skip(f"cfgrib isn't version {cat.cfgribVersion}, so the shared index store isn't used")
+    builds, openFileIndex = [], cat.cfgribDataset.open_fileindex
+    def countingOpen(*args, **kwargs):
+        builds.append(args[1])
+        time.sleep(0.2)
+        return openFileIndex(*args, **kwargs)
+    monkeypatch.setattr(cat.cfgribDataset, "open_fileindex", countingOpen)
+
+    barrier = threading.Barrier(8)
+    def getIndex():
+        barrier.wait()
+        return cat.getFileIndex(gribPath)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        indexes = list(pool.map(lambda _: getIndex(), range(8)))
+    assert len(builds) == 1
+    assert all(index is indexes[0] for index in indexes)
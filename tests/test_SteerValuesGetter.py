@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import xarray as xr
+import UsefulFunctions as uf
+import ParallelFunctions as paf
+import SteerValuesGetter as sv
+
+
+def setUpCrossSections(tmp_path, monkeypatch):
+    # runs getCrossSections in a temporary directory with empty source files and a stand-in for the cross section calculation, returning the
+    # list that each calculated (member, hour) is added to
+    monkeypatch.chdir(tmp_path)
+    os.mkdir(tmp_path / "SteerValues")
+    monkeypatch.setattr(sv, "hours", np.array([0, 24]))
+
+    def getDataPath(model, member, forecastHour=-1, product="parent.atm", storm="ian", init="2022092400"):
+        path = tmp_path / f"{storm}.{init}.{model}.{member:02}.{product}.f{forecastHour:03}"
+        if not path.exists():
+            path.touch()
+        return str(path)
+
+    calculated = []
+    def getCrossSection(model, member, forecastHour, winds=None):
+        calculated.append((member, forecastHour))
+        levels, radialDistance = np.array([1000, 500]), np.array([0.5, 1.5])
+        radAvgData = xr.DataArray(np.full((2, 2), member + forecastHour), dims=["level", "radial_distance"],
+                                  coords={"level": levels, "radial_distance": radialDistance})
+        profile = xr.DataArray(np.zeros(2), dims=["isobaricInhPa"], coords={"isobaricInhPa": levels})
+        return radAvgData, profile, profile, {"MSLP": 990}
+
+    monkeypatch.setattr(uf, "getDataPath", getDataPath)
+    monkeypatch.setattr(sv, "getCrossSection", getCrossSection)
+    monkeypatch.setattr(paf, "getPrefetched", lambda items, loadFunc, **kwargs: ((item, None) for item in items))
+    return calculated
+
+
+def test_getCrossSectionsReused(tmp_path, monkeypatch):
+    calculated = setUpCrossSections(tmp_path, monkeypatch)
+    sections = sv.getCrossSections("HFSB_test", [0, 1])
+    assert len(calculated) == 4
+    reused = sv.getCrossSections("HFSB_test", [0, 1])
+    assert len(calculated) == 4
+    np.testing.assert_array_equal(reused.crossSection.values, sections.crossSection.values)
+
+
+def test_getCrossSectionsSourceChanged(tmp_path, monkeypatch):
+    # rewriting one of the wind files has to force the cross sections to be calculated again
+    calculated = setUpCrossSections(tmp_path, monkeypatch)
+    sv.getCrossSections("HFSB_test", [0, 1])
+    path = uf.getDataPath("HFSB_test", 1, 24)
+    os.utime(path, (os.path.getatime(path), os.path.getmtime(path) + 10))
+    sv.getCrossSections("HFSB_test", [0, 1])
+    assert len(calculated) == 8
+
+
+def test_getCrossSectionsSettingsChanged(tmp_path, monkeypatch):
+    # so does changing the radial bins or the storm
+    calculated = setUpCrossSections(tmp_path, monkeypatch)
+    sv.getCrossSections("HFSB_test", [0, 1])
+    monkeypatch.setattr(uf, "radialBins", np.linspace(0, 3, 40))
+    sv.getCrossSections("HFSB_test", [0, 1])
+    assert len(calculated) == 8
+    monkeypatch.setattr(sv, "storm", "fiona")
+    sv.getCrossSections("HFSB_test", [0, 1])
+    assert len(calculated) == 12
+
+
+def test_getMemberTrack(monkeypatch):
+    # each track is only read once, but changing the storm, initialization, or hours reads it again rather than reusing the old one
+    reads = []
+    def getAtcfData(model, members, hours, storm, init):
+        reads.append((storm, init, tuple(hours)))
+        return [reads[-1]]
+    monkeypatch.setattr(uf, "getAtcfData", getAtcfData)
+    sv.getMemberTrack.cache_clear()
+
+    assert sv.getMemberTrack("HFSB_test", 0, (0, 24), "ian", "2022092400") == ("ian", "2022092400", (0, 24))
+    assert sv.getMemberTrack("HFSB_test", 0, (0, 24), "ian", "2022092400") == ("ian", "2022092400", (0, 24))
+    assert sv.getMemberTrack("HFSB_test", 0, (0, 24), "fiona", "2022091800") == ("fiona", "2022091800", (0, 24))
+    assert sv.getMemberTrack("HFSB_test", 0, (0, 24, 48), "ian", "2022092400") == ("ian", "2022092400", (0, 24, 48))
+    assert len(reads) == 3
+    sv.getMemberTrack.cache_clear()
@@ -0,0 +1,210 @@
+import warnings
+import itertools
+import numpy as np
+import pandas as pd
+import xarray as xr
+import UsefulFunctions as uf
+
+rng = np.random.default_rng(0)
+
+
+def getCrossSections(numMembers, numHours):
+    # synthetic radial-averaged wind cross sections like getRadAvgWinds makes, with a vortex whose size, strength, and depth vary by member
+    # and hour, some noise so the derivative changes sign, and the empty bins near the center that the real ones have
+    levels = np.arange(1000, 75, -25)
+    radialDistance = 0.5 * (uf.radialBins[:-1] + uf.radialBins[1:])
+    sections = np.empty((numMembers, numHours, len(levels), len(radialDistance)))
+    for member, hour in itertools.product(range(numMembers), range(numHours)):
+        rmw, vmax, depth = rng.uniform(0.3, 1.2), rng.uniform(20, 60), rng.uniform(300, 700)
+        profile = (radialDistance / rmw) * np.exp(1 - radialDistance / rmw)
+        decay = np.exp(-((1000 - levels) / depth)**2)
+        sections[member, hour] = vmax * decay[:, np.newaxis] * profile + rng.normal(0, 1.5, (len(levels), len(radialDistance)))
+    sections[..., 0] = np.nan
+    coords = {"member": range(numMembers), "hour": range(numHours), "level": levels, "radial_distance": radialDistance}
+    crossSections = xr.DataArray(sections, dims=["member", "hour", "level", "radial_distance"], coords=coords)
+    minPressures = xr.DataArray(rng.uniform(930, 1010, (numMembers, numHours)), dims=["member", "hour"])
+    return crossSections, minPressures
+
+
+def test_getVortexSweep():
+    # every combination of settings has to give the same bounds as running getDynamicVortex on each cross section
+    crossSections, minPressures = getCrossSections(3, 4)
+    sweepParams = {"searchDepth": [150, 200, 250], "strongThreshold": [0.4, 0.6], "weakThreshold": [0.75], "thresholdPressure": [980, 1000],
+                   "minRadiusIdx": [2, 4], "radiusFactor": [2, 3]}
+    vortexData = uf.getVortexSweep(crossSections, minPressures, **sweepParams)
+    assert vortexData.sizes["param"] == 3 * 2 * 2 * 2 * 2
+
+    for p in range(vortexData.sizes["param"]):
+        params = {name: vortexData[name].values[p].item() for name in sweepParams}
+        for member, hour in itertools.product(range(3), range(4)):
+            atcfTimeStamp = {"MSLP": minPressures.values[member, hour]}
+            expected = uf.getDynamicVortex(crossSections.isel(member=member, hour=hour), atcfTimeStamp, **params)
+            bounds = vortexData.isel(param=p, member=member, hour=hour)
+            assert bounds.vortexBottom.item() == expected[0]
+            assert bounds.vortexTop.item() == expected[1]
+            assert bounds.vortexLeft.item() == expected[2]
+            assert bounds.vortexRight.item() == expected[3]
+
+
+def getTracks(lats, lons):
+    # ATCF-like DataFrames (one per member) from (member, hour) latitude and longitude arrays
+    return [pd.DataFrame({"latitude": memberLats, "longitude": memberLons}) for memberLats, memberLons in zip(lats, lons)]
+
+
+def test_getGreatCircle():
+    # a degree along the equator or a meridian, a quarter of the way around the earth, and a degree across the dateline
+    distance, bearing = uf.getGreatCircle(np.array([0, 0, 0, 0]), np.array([0, 0, 0, 179.5]), np.array([0, 1, 90, 0]),
+                                          np.array([1, 0, 0, -179.5]))
+    np.testing.assert_allclose(distance, [111.195, 111.195, 10007.543, 111.195], atol=1e-3)
+    np.testing.assert_allclose(bearing, [90, 0, 0, 90], atol=1e-9)
+
+
+def test_getTrackDistances():
+    # two tracks that are a degree of latitude apart at every hour, and a third that's on top of the first
+    lats = np.array([[20, 22, 24], [21, 23, 25], [20, 22, 24]], dtype=float)
+    lons = np.full((3, 3), 280.0)
+    distances = uf.getTrackDistances(getTracks(lats, lons))
+    np.testing.assert_allclose(distances, [[0, 111.195, 0], [111.195, 0, 111.195], [0, 111.195, 0]], atol=1e-3)
+
+    # several schemes are pooled in the order they're given
+    pooled = uf.getTrackDistances(getTracks(lats[:1], lons[:1]), getTracks(lats[1:], lons[1:]))
+    np.testing.assert_allclose(pooled, distances)
+
+
+def test_getTrackClusters():
+    # two groups of tracks that are far apart, with the members shuffled so the groups aren't in order
+    lats = np.concatenate([20 + rng.normal(0, 0.2, (4, 5)), 30 + rng.normal(0, 0.2, (3, 5))])[[0, 4, 1, 5, 2, 6, 3]]
+    lons = np.full((7, 5), 280.0)
+    distances = uf.getTrackDistances(getTracks(lats, lons))
+    groups = np.array([0, 1, 0, 1, 0, 1, 0])
+    for method in ["hierarchical", "kmedoids"]:
+        labels = uf.getTrackClusters(distances, 2, method)
+        assert sorted(set(labels)) == [0, 1]
+        assert (labels == groups).all() or (labels == 1 - groups).all()
+
+
+def test_getTrackClustersIdenticalTracks():
+    # k-medoids still finds both clusters when most of the members share exactly the same track
+    lats = np.array([[20] * 3] * 4 + [[30] * 3] * 2, dtype=float)
+    lons = np.full((6, 3), 280.0)
+    labels = uf.getTrackClusters(uf.getTrackDistances(getTracks(lats, lons)), 2, "kmedoids")
+    assert len(set(labels[:4])) == 1 and len(set(labels[4:])) == 1 and labels[0] != labels[4]
+
+
+def test_getInterpolatedTracks():
+    # every member's track matches np.interp, holding the end points outside of the ATCF hours, however the hours are ordered
+    hours = np.array([0, 24, 48, 60])
+    lats, lons = rng.uniform(15, 35, (3, 4)), rng.uniform(260, 300, (3, 4))
+    newHours = np.arange(-6, 67, 3)
+    newLats, newLons = uf.getInterpolatedTracks(getTracks(lats, lons), hours, newHours)
+    for member in range(3):
+        np.testing.assert_allclose(newLats[member], np.interp(newHours, hours, lats[member]))
+        np.testing.assert_allclose(newLons[member], np.interp(newHours, hours, lons[member]))
+
+    order = [2, 0, 3, 1]
+    shuffledLats, shuffledLons = uf.getInterpolatedTracks(getTracks(lats[:, order], lons[:, order]), hours[order], newHours)
+    np.testing.assert_allclose(shuffledLats, newLats)
+    np.testing.assert_allclose(shuffledLons, newLons)
+
+    # a single ATCF hour is held for every new hour
+    singleLats, singleLons = uf.getInterpolatedTracks(getTracks(lats[:, :1], lons[:, :1]), hours[:1], newHours)
+    np.testing.assert_array_equal(singleLats, np.repeat(lats[:, :1], len(newHours), axis=1))
+    np.testing.assert_array_equal(singleLons, np.repeat(lons[:, :1], len(newHours), axis=1))
+
+
+def test_getTrackMotion():
+    # one storm moving north along a meridian and one moving east along the equator, both at a degree every 6 hours
+    hours = np.array([0, 6, 12, 18])
+    lats = np.array([[20, 21, 22, 23], [0, 0, 0, 0]], dtype=float)
+    lons = np.array([[280, 280, 280, 280], [280, 281, 282, 283]], dtype=float)
+    speed, direction = uf.getTrackMotion(lats, lons, hours)
+    np.testing.assert_allclose(speed, 111.195 / 6 / 1.852, rtol=1e-5)
+    np.testing.assert_allclose(direction, [[0] * 4, [90] * 4], atol=1e-9)
+
+
+def test_getTrackProbabilities():
+    # every grid point's strike probability and track density match counting the interpolated positions within the radius one by one,
+    # including a track that leaves the grid
+    hours = np.array([0, 24, 48])
+    lats = np.array([[20, 24, 29], [21, 23, 27], [18, 22, 26], [30, 34, 40]], dtype=float)
+    lons = np.array([[285, 282, 280], [284, 281, 276], [286, 283, 281], [280, 283, 288]], dtype=float)
+    gridLats, gridLons = np.arange(15, 35.01, 0.5), np.arange(270, 290.01, 0.5)
+    windows, radius, stepHours = [(0, 24), (24, 48), (0, 48)], 150, 3
+    probabilityData = uf.getTrackProbabilities(getTracks(lats, lons), hours, gridLats, gridLons, radius, windows, stepHours)
+
+    newHours = np.arange(0, 49, stepHours)
+    newLats = np.array([np.interp(newHours, hours, memberLats) for memberLats in lats])
+    newLons = np.array([np.interp(newHours, hours, memberLons) for memberLons in lons])
+    for i, (start, end) in enumerate(windows):
+        inWindow = (newHours >= start) & ((newHours < end) | (newHours == end) & (end == 48))
+        distance, _ = uf.getGreatCircle(newLats[:, inWindow, np.newaxis, np.newaxis], newLons[:, inWindow, np.newaxis, np.newaxis],
+                                        gridLats[:, np.newaxis], gridLons)
+        within = distance <= radius
+        np.testing.assert_allclose(probabilityData.strikeProbability[i], within.any(axis=1).mean(axis=0), atol=1e-6)
+        np.testing.assert_allclose(probabilityData.trackDensity[i], within.sum(axis=1).mean(axis=0) * stepHours, atol=1e-5)
+
+    # adjacent windows don't share their boundary hour, so they add up to the whole forecast
+    np.testing.assert_allclose(probabilityData.trackDensity[0] + probabilityData.trackDensity[1], probabilityData.trackDensity[2], atol=1e-5)
+
+
+def getField(lats, lons, dims=(), coords=None):
+    # a random field on a regular lat/lon grid with any extra leading dimensions
+    coords = dict(coords or {})
+    shape = tuple(len(coords[dim]) for dim in dims) + (len(lats), len(lons))
+    coords.update({"latitude": lats, "longitude": lons})
+    return xr.DataArray(rng.normal(size=shape), dims=list(dims) + ["latitude", "longitude"], coords=coords, name="gh")
+
+
+def test_getCenterBoxes():
+    # boxes around a (member, hour) array of centers match slicing each field with .sel, for a south to north grid with levels and a north to
+    # south one like the GFS analysis
+    centerLats, centerLons = rng.uniform(15, 30, (2, 3)), rng.uniform(270, 290, (2, 3))
+    southToNorth = getField(np.arange(10, 35.01, 0.25), np.arange(260, 300.01, 0.25), ["member", "hour", "isobaricInhPa"],
+                            {"member": range(2), "hour": [0, 24, 48], "isobaricInhPa": [850, 500]})
+    northToSouth = getField(np.arange(35, 9.99, -0.25), np.arange(260, 300.01, 0.25))
+    for varData in [southToNorth, northToSouth]:
+        boxData = uf.getCenterBoxes(varData, centerLats, centerLons, 2.5)
+        assert boxData.sizes["y"] == boxData.sizes["x"] == 21
+        for member, hour in itertools.product(range(2), range(3)):
+            centerLat, centerLon = np.round(centerLats[member, hour] * 4) / 4, np.round(centerLons[member, hour] * 4) / 4
+            fieldData = varData.isel(member=member, hour=hour) if "member" in varData.dims else varData
+            expected = fieldData.sortby("latitude").sel(latitude=slice(centerLat - 2.501, centerLat + 2.501),
+                                                        longitude=slice(centerLon - 2.501, centerLon + 2.501))
+            box = boxData.isel(member=member, hour=hour)
+            np.testing.assert_array_equal(box.transpose(*expected.dims[:-2], "y", "x").values, expected.values)
+            np.testing.assert_allclose(box.latitude.values, expected.latitude.values)
+            np.testing.assert_allclose(box.longitude.values, expected.longitude.values)
+
+
+def test_getCenterBoxesOutsideDomain():
+    # the parts of a box that fall outside of the domain are NaN rather than wrapped around from the other side
+    varData = getField(np.arange(10, 35.01, 0.5), np.arange(260, 300.01, 0.5))
+    box = uf.getCenterBoxes(varData, 11, 299, 2)
+    assert np.isnan(box.values[:2]).all() and np.isnan(box.values[:, -2:]).all()
+    assert not np.isnan(box.values[2:, :-2]).any()
+
+
+def test_getStormComposite(monkeypatch):
+    # the running (Welford) mean and spread over the members match np.nanmean and np.nanstd of every member's storm-centered boxes, including
+    # the box points that are outside of the domain for some members and for all of them
+    hours, members = np.array([0, 24]), [0, 1, 2, 3]
+    lats, lons = np.arange(10, 35.01, 0.5), np.arange(260, 300.01, 0.5)
+    centerLats = np.array([[12, 13], [11, 12], [13, 14], [32, 33]], dtype=float)
+    centerLons = np.array([[262, 263], [264, 265], [263, 262], [296, 297]], dtype=float)
+    fields = {(member, forecastHour): getField(lats, lons) * 10 + 5000 for member in members for forecastHour in hours}
+    monkeypatch.setattr(uf, "getAtcfData", lambda model, members, hours, storm, init: getTracks(centerLats[members], centerLons[members]))
+    monkeypatch.setattr(uf, "getMemberData", lambda model, variable, members, forecastHour, level, storm, init: fields[members[0], forecastHour])
+
+    compositeData = uf.getStormComposite("HFSB_test", "height", members, hours, 500, boxRadius=5)
+    boxes = np.array([[uf.getCenterBoxes(fields[member, forecastHour], centerLats[member, i], centerLons[member, i], 5).values
+                       for i, forecastHour in enumerate(hours)] for member in members])
+    with warnings.catch_warnings():
+        # the points that no member has give all-NaN slices
+        warnings.simplefilter("ignore", RuntimeWarning)
+        expectedMean, expectedSpread = np.nanmean(boxes, axis=0), np.nanstd(boxes, axis=0, ddof=1)
+    counts = (~np.isnan(boxes)).sum(axis=0)
+    expectedSpread[counts == 1] = 0
+    assert (counts == 0).any() and (counts == 1).any()
+    np.testing.assert_allclose(compositeData["mean"].values, expectedMean, rtol=1e-6)
+    np.testing.assert_allclose(compositeData.spread.values, expectedSpread, rtol=1e-4, atol=1e-3)
+    assert compositeData.attrs["members"] == 4